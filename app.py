@@ -1,12 +1,43 @@
+import logging
+import sys
 import streamlit as st
 from streamlit_option_menu import option_menu
 import home
-import detection
-import visualization
+from config import LOG_LEVEL
+from instrumentation import import_seconds, start_exporters, timed_import
+
+logging.basicConfig(level=LOG_LEVEL)
+
+# The Detection and Visualizing pages pull in TensorFlow, Plotly and pandas, so they are only
+# imported the first time they are opened. Their heaviest dependencies are imported one by one
+# first, so the startup report shows what each of them costs (the execution profile goes before
+# TensorFlow, which reads its oneDNN setting on import).
+PAGE_DEPENDENCIES = {
+    'detection': ['numpy', 'pandas', 'execution_profile', 'tensorflow'],
+    'visualization': ['pandas', 'plotly.graph_objects', 'plotly.express'],
+}
+
+def load_page(module_name):
+    if module_name not in sys.modules:
+        for dependency in PAGE_DEPENDENCIES[module_name]:
+            timed_import(dependency)
+        timed_import(module_name)
+        logging.info("Startup imports (seconds): " + ", ".join(
+            f"{name} {seconds:.2f}" for name, seconds in import_seconds.items()))
+    return timed_import(module_name)
+
+def detection_app():
+    load_page('detection').app()
+
+def visualization_app():
+    load_page('visualization').app()
 
 # Set page configuration with wide layout, page title, and icon
 st.set_page_config(layout="wide", page_title="Cancer Detective", page_icon="🎗️")
 
+# Export hot-path metrics if configured (runs once per process, not on every rerun)
+start_exporters()
+
 # Custom CSS to disable scrolling in the sidebar and reduce empty space
 st.markdown("""
             <style>
@@ -267,6 +298,6 @@ class MultiApp:
 # Add the individual apps to the MultiApp instance
 app = MultiApp()
 app.add_app("Home", home.app)
-app.add_app("Detection", detection.app)
-app.add_app("Visualizing", visualization.app)
+app.add_app("Detection", detection_app)
+app.add_app("Visualizing", visualization_app)
 app.run()
@@ -0,0 +1,127 @@
+import argparse
+import logging
+import os
+import threading
+import numpy as np
+from tf_runtime import tf
+from config import BACKENDS, TFLITE_THREADS, TFLITE_XNNPACK
+from model_registry import MODEL_PATHS, registry
+from preprocessing import model_input_size
+
+# Inference backends: every backend takes a float32 batch (n x height x width x 3) and returns
+# the model's raw output with the same shape Keras would, so the predict functions don't care
+# which one is running. The backend is chosen per model with CANCER_DETECTIVE_BACKENDS,
+# e.g. "skin=tflite,lung=tflite" (models not listed use Keras).
+
+# Converted TFLite file for a model: models/skin_cancer_model.h5 -> models/skin_cancer_model.tflite
+def tflite_path(name):
+    return os.path.splitext(MODEL_PATHS[name])[0] + '.tflite'
+
+# Current Keras path, sharing the model loaded by the registry
+class KerasBackend:
+    kind = 'keras'
+
+    def __init__(self, model):
+        self.model = model
+        self.input_size = model_input_size(model)
+
+    def predict(self, batch):
+        return self.model.predict(batch, batch_size=len(batch), verbose=0)
+
+# TFLite interpreter on CPU. XNNPACK is TFLite's default CPU delegate, so it is used unless
+# CANCER_DETECTIVE_TFLITE_XNNPACK=0; `num_threads` sets its thread pool size.
+class TFLiteBackend:
+    kind = 'tflite'
+
+    def __init__(self, model_path, num_threads=None, use_xnnpack=True):
+        resolver = (tf.lite.experimental.OpResolverType.AUTO if use_xnnpack
+                    else tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads,
+                                               experimental_op_resolver_type=resolver)
+        self.interpreter.allocate_tensors()
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+        height, width = self.input_detail['shape'][1:3]
+        self.input_size = (int(width), int(height))
+        # An interpreter holds a single set of tensors, so calls must not overlap
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        with self._lock:
+            index = self.input_detail['index']
+            if self.interpreter.get_input_details()[0]['shape'][0] != len(batch):
+                self.interpreter.resize_tensor_input(index, batch.shape)
+                self.interpreter.allocate_tensors()
+
+            # Fully quantized models take integer inputs and produce integer outputs
+            input_scale, input_zero_point = self.input_detail['quantization']
+            if input_scale:
+                batch = np.round(batch / input_scale + input_zero_point).astype(self.input_detail['dtype'])
+            self.interpreter.set_tensor(index, batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output_detail['index']).copy()
+
+            output_scale, output_zero_point = self.output_detail['quantization']
+            if output_scale:
+                output = (output.astype(np.float32) - output_zero_point) * output_scale
+            return output
+
+def load_backend(name):
+    if BACKENDS.get(name) == 'tflite':
+        path = tflite_path(name)
+        if os.path.exists(path):
+            backend = TFLiteBackend(path, TFLITE_THREADS, TFLITE_XNNPACK)
+            logging.info(f"{name} model served by TFLite from {path}")
+            return backend
+        logging.error(f"TFLite backend requested for {name} but {path} does not exist "
+                      f"(run `python backends.py convert {name}`); using Keras")
+
+    model = registry.get(name)
+    return KerasBackend(model) if model is not None else None
+
+_backends = {}
+_locks = {name: threading.Lock() for name in MODEL_PATHS}
+
+# Backend serving a model, created on first use (None if the model could not be loaded)
+def get_backend(name):
+    if name in _backends:
+        return _backends[name]
+    with _locks[name]:
+        if name not in _backends:
+            _backends[name] = load_backend(name)
+        return _backends[name]
+
+# Identity of the artifact a model is served from, used to key cached predictions
+def backend_model_id(name):
+    model_id = registry.model_id(name)
+    if model_id is None or BACKENDS.get(name) != 'tflite':
+        return model_id
+    try:
+        stat = os.stat(tflite_path(name))
+    except OSError:
+        return model_id
+    return f"{model_id}-tflite-{stat.st_size}-{stat.st_mtime_ns}"
+
+# Convert a Keras model to a TFLite flatbuffer
+def convert_to_tflite(model):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    return converter.convert()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the Keras models to TFLite for the TFLite backend.")
+    parser.add_argument('command', choices=['convert'])
+    parser.add_argument('models', nargs='*', default=sorted(MODEL_PATHS), help="Models to convert (default: all)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    for name in args.models:
+        model = registry.get(name)
+        if model is None:
+            continue
+        path = tflite_path(name)
+        with open(path, 'wb') as file:
+            file.write(convert_to_tflite(model))
+        logging.info(f"Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from config import BATCH_SIZE, DECODE_WORKERS, PREFETCH
+from datasets import iter_images
+from inference import CANCEROUS, CLASS_NAMES
+from instrumentation import start_exporters
+from pipeline import Pipeline
+
+# Headless batch scorer: streams a directory (or list) of images through the detection models
+# and writes one result per image and model to JSONL or CSV, without importing Streamlit.
+#
+#   python batch_score.py archive/ --model skin lung --output results.jsonl --resume
+
+# Yield image paths one at a time: directories are walked lazily in a stable order, and
+# arguments starting with '@' name a text file with one path per line
+def iter_image_paths(inputs):
+    for item in inputs:
+        if item.startswith('@'):
+            with open(item[1:], 'r') as file:
+                for line in file:
+                    line = line.strip()
+                    if line:
+                        yield line
+        elif os.path.isdir(item):
+            yield from iter_images(item)
+        else:
+            yield item
+
+# Cut an interrupted run's partial last record, so records appended on resume start on a fresh
+# line and the partial one is neither counted as done nor merged into the next record
+def drop_partial_line(output_path, block_size=1 << 16):
+    with open(output_path, 'rb+') as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b'\n')
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            logging.info(f"Dropping a partial last record from {output_path}")
+            file.truncate(position)
+
+# Paths already written for each model by an earlier, possibly interrupted, run
+def completed_paths(output_path, output_format):
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    drop_partial_line(output_path)
+    with open(output_path, 'r', newline='') as file:
+        if output_format == 'jsonl':
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A damaged line; that image is scored again
+                    continue
+                done.add((record['path'], record['model']))
+        else:
+            for row in csv.DictReader(file):
+                done.add((row['path'], row['model']))
+    return done
+
+# Writes result records as JSONL, or as CSV with one column per class of any model
+class ResultWriter:
+    def __init__(self, output_path, output_format, models):
+        self.output_format = output_format
+        write_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self.file = open(output_path, 'a', newline='')
+        if output_format == 'csv':
+            fields = ['path', 'model', 'class', 'status', 'error']
+            fields += [class_name for name in models for class_name in CLASS_NAMES[name] if class_name not in fields]
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=fields)
+            if write_header:
+                self.csv_writer.writeheader()
+
+    def write(self, record):
+        if self.output_format == 'jsonl':
+            self.file.write(json.dumps(record) + '\n')
+        else:
+            row = {key: value for key, value in record.items() if key != 'probabilities'}
+            row.update(record.get('probabilities') or {})
+            self.csv_writer.writerow(row)
+
+    # Flushed after every batch, so an interrupted run loses at most one batch of work
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def score(inputs, models, output_path, output_format, batch_size=BATCH_SIZE, resume=False,
+          decode_workers=DECODE_WORKERS, prefetch=PREFETCH):
+    done = completed_paths(output_path, output_format) if resume else set()
+    if not resume and os.path.exists(output_path):
+        os.remove(output_path)
+
+    pipeline = Pipeline(models, batch_size=batch_size, decode_workers=decode_workers, prefetch=prefetch)
+    counts = {'scored': 0, 'skipped': 0, 'failed': 0}
+
+    # Images every requested model has already scored are never decoded
+    def pending_paths():
+        for path in iter_image_paths(inputs):
+            if all((path, name) in done for name in models):
+                counts['skipped'] += 1
+            else:
+                yield path
+
+    writer = ResultWriter(output_path, output_format, models)
+    try:
+        for paths, predictions, failures in pipeline.run(pending_paths()):
+            for path, error in failures:
+                for name in models:
+                    writer.write({'path': path, 'model': name, 'class': None, 'status': None, 'error': error})
+            counts['failed'] += len(failures)
+
+            for name in models:
+                for path, vector in zip(paths, predictions.get(name, [])):
+                    if (path, name) in done:
+                        continue
+                    predicted = int(vector.argmax())
+                    writer.write({
+                        'path': path,
+                        'model': name,
+                        'class': CLASS_NAMES[name][predicted],
+                        'status': 'Cancerous' if CANCEROUS[name][predicted] else 'Non-Cancerous',
+                        'error': None,
+                        'probabilities': {class_name: round(float(p), 6) for class_name, p in zip(CLASS_NAMES[name], vector)},
+                    })
+            counts['scored'] += len(paths)
+            writer.flush()
+            logging.info("Scored %d images (%d already done, %d failed)", counts['scored'], counts['skipped'], counts['failed'])
+    finally:
+        writer.close()
+        pipeline.log_report()
+
+    return counts['scored'], counts['skipped'], counts['failed']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a directory or list of images with the Cancer Detective models.")
+    parser.add_argument('inputs', nargs='+', help="Image files, directories, or @file with one path per line")
+    parser.add_argument('--model', nargs='+', choices=sorted(CLASS_NAMES), required=True, help="Models to run on every image")
+    parser.add_argument('--output', required=True, help="Result file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Output format (default: from the output file extension)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Images per forward pass")
+    parser.add_argument('--resume', action='store_true', help="Skip images already present in the output file")
+    parser.add_argument('--decode-workers', type=int, default=DECODE_WORKERS, help="Threads decoding and resizing images")
+    parser.add_argument('--prefetch', type=int, default=PREFETCH, help="Decoded images buffered ahead of the model")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    start_exporters()
+    output_format = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    try:
+        scored, skipped, failed = score(args.inputs, args.model, args.output, output_format,
+                                        batch_size=args.batch_size, resume=args.resume,
+                                        decode_workers=args.decode_workers, prefetch=args.prefetch)
+    except RuntimeError as e:
+        logging.error(str(e))
+        return 1
+
+    print(f"Done: {scored} scored, {skipped} skipped, {failed} failed -> {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+from tf_runtime import tf
+from PIL import Image
+from inference import CLASS_NAMES, predict_leukemia_image, predict_lung_image, predict_skin_image, run_model
+from backends import get_backend
+from model_registry import registry
+from preprocessing import MODEL_INPUT_SIZE, decode_image
+from preview import encode_preview
+
+# Benchmarks for the detection hot path. The real models are Git LFS files, so this builds
+# random-weight stand-ins with the same input and output shapes and times every stage of the
+# predict functions and the upload display path on synthetic images.
+#
+#   python benchmark.py --output benchmark_results.json
+#   python benchmark.py --compare benchmark_results.json   # exits 1 on a regression
+
+RESOLUTIONS = [256, 1024, 2048, 4096]
+PREDICT_FUNCTIONS = {
+    'skin': predict_skin_image,
+    'leukemia': predict_leukemia_image,
+    'lung': predict_lung_image,
+}
+
+# Random-weight model shaped like the real one: 224x224x3 in, one probability per class out
+# (the leukemia model has a single sigmoid output)
+def build_stand_in(name, architecture):
+    width, height = MODEL_INPUT_SIZE
+    inputs = tf.keras.Input(shape=(height, width, 3))
+    if architecture == 'small':
+        x = tf.keras.layers.Conv2D(16, 3, strides=2, activation='relu')(inputs)
+        x = tf.keras.layers.Conv2D(32, 3, strides=2, activation='relu')(x)
+        x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    else:
+        backbone = {
+            'efficientnetb0': tf.keras.applications.EfficientNetB0,
+            'efficientnetb3': tf.keras.applications.EfficientNetB3,
+        }[architecture]
+        x = backbone(include_top=False, weights=None, input_tensor=inputs, pooling='avg').output
+    if name == 'leukemia':
+        outputs = tf.keras.layers.Dense(1, activation='sigmoid')(x)
+    else:
+        outputs = tf.keras.layers.Dense(len(CLASS_NAMES[name]), activation='softmax')(x)
+    return tf.keras.Model(inputs, outputs, name=f"{name}_stand_in")
+
+# Reproducible noise image with a smooth gradient, so encoders can't compress it to nothing
+def synthetic_image(resolution, seed=0):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, resolution, dtype=np.float32)
+    pixels = (gradient[None, :, None] * 0.5 + rng.integers(0, 128, (resolution, resolution, 3))).clip(0, 255)
+    return Image.fromarray(pixels.astype(np.uint8), 'RGB')
+
+def encode(image, image_format):
+    buffered = io.BytesIO()
+    image.save(buffered, format=image_format)
+    return buffered.getvalue()
+
+# Run `fn` a few times untimed, then `repeats` times timed; returns summary statistics in ms
+def measure(fn, repeats, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3),
+        'repeats': repeats,
+    }
+
+def run_benchmarks(resolutions, repeats, architecture):
+    for name in CLASS_NAMES:
+        registry.register(name, build_stand_in(name, architecture))
+
+    results = []
+    def record(stage, stats, **labels):
+        results.append({'stage': stage, **labels, **stats})
+        print(f"{stage:<16} {json.dumps(labels):<45} median {stats['median_ms']:>9.3f} ms")
+
+    # Model stage on a ready batch, independent of the image resolution
+    batch = np.random.default_rng(0).random((1, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.float32)
+    for name in CLASS_NAMES:
+        backend = get_backend(name)
+        record('predict', measure(lambda: run_model(name, backend, batch), repeats), model=name)
+
+    for resolution in resolutions:
+        image = synthetic_image(resolution)
+        for image_format in ('JPEG', 'PNG'):
+            data = encode(image, image_format)
+            labels = {'resolution': resolution, 'format': image_format}
+            # The upload decode path, with its JPEG draft mode and integer-factor reduction
+            record('decode', measure(lambda: decode_image(io.BytesIO(data)), repeats), **labels)
+
+        resized = image.resize(MODEL_INPUT_SIZE, Image.Resampling.LANCZOS)
+        labels = {'resolution': resolution}
+        record('resize', measure(lambda: image.resize(MODEL_INPUT_SIZE, Image.Resampling.LANCZOS), repeats), **labels)
+        record('normalize', measure(lambda: np.asarray(resized, dtype=np.float32) / 255.0, repeats), **labels)
+        record('display', measure(lambda: encode_preview(image), repeats), **labels)
+
+        # End to end, without image bytes so the prediction cache is never used
+        for name, predict in PREDICT_FUNCTIONS.items():
+            record(f"predict_{name}_image", measure(lambda: predict(image), repeats), **labels)
+
+    return results
+
+def environment(architecture, repeats):
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'tensorflow': tf.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'architecture': architecture,
+        'repeats': repeats,
+    }
+
+def result_key(result):
+    return tuple(sorted((key, value) for key, value in result.items() if key in ('stage', 'model', 'resolution', 'format')))
+
+# Stages whose median got slower than `threshold` times the baseline
+def regressions(baseline, results, threshold):
+    previous = {result_key(result): result for result in baseline['results']}
+    slower = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before and before['median_ms'] > 0 and result['median_ms'] / before['median_ms'] > threshold:
+            slower.append({**dict(result_key(result)), 'before_ms': before['median_ms'], 'after_ms': result['median_ms']})
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the detection hot path with stand-in models.")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=RESOLUTIONS)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--architecture', choices=['small', 'efficientnetb0', 'efficientnetb3'], default='efficientnetb0',
+                        help="Backbone of the stand-in models")
+    parser.add_argument('--compare', help="Earlier results file to check for regressions")
+    parser.add_argument('--threshold', type=float, default=1.2, help="Slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    # Read the baseline first, in case it is also the output file
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+
+    results = run_benchmarks(args.resolutions, args.repeats, args.architecture)
+    with open(args.output, 'w') as file:
+        json.dump({'environment': environment(args.architecture, args.repeats), 'results': results}, file, indent=4)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        slower = regressions(baseline, results, args.threshold)
+        for item in slower:
+            print(f"REGRESSION {item}")
+        return 1 if slower else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
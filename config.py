@@ -0,0 +1,88 @@
+import os
+
+# Runtime settings, read from CANCER_DETECTIVE_* environment variables with sensible defaults
+
+def env_str(name, default=None):
+    return os.environ.get(f"CANCER_DETECTIVE_{name}") or default
+
+def env_int(name, default):
+    value = env_str(name)
+    return int(value) if value else default
+
+def env_bool(name, default):
+    value = env_str(name)
+    return value.lower() not in ('0', 'false', 'no', 'off') if value else default
+
+def env_float(name, default):
+    value = env_str(name)
+    return float(value) if value else default
+
+# Log level of the app; DEBUG also logs every prediction
+LOG_LEVEL = env_str("LOG_LEVEL", "INFO").upper()
+
+# Number of images stacked into one forward pass in batch mode
+BATCH_SIZE = env_int("BATCH_SIZE", 16)
+
+# Inference admission control, per model and shared by all sessions: forward passes running at once, callers
+# allowed to wait for one, and how long they wait (seconds) before being told the model is busy
+INFERENCE_CONCURRENCY = env_int("INFERENCE_CONCURRENCY", 1)
+INFERENCE_QUEUE_SIZE = env_int("INFERENCE_QUEUE_SIZE", 8)
+INFERENCE_QUEUE_TIMEOUT = env_float("INFERENCE_QUEUE_TIMEOUT", 10.0)
+
+# Detection page: predictions running in the background at once, across all sessions
+DETECTION_WORKERS = env_int("DETECTION_WORKERS", 4)
+
+# Bulk scoring pipeline: decode/resize worker threads, and decoded images buffered ahead of the model
+DECODE_WORKERS = env_int("DECODE_WORKERS", min(4, os.cpu_count() or 1))
+PREFETCH = env_int("PREFETCH", 64)
+
+# Uploads are downscaled while decoding to a shorter side of at least DECODE_MIN_SIZE pixels (0 decodes at
+# full size). Files over MAX_IMAGE_BYTES, or over MAX_IMAGE_PIXELS once decoded, are rejected (0 disables a limit).
+DECODE_MIN_SIZE = env_int("DECODE_MIN_SIZE", 500)
+MAX_IMAGE_BYTES = env_int("MAX_IMAGE_BYTES", 50_000_000)
+MAX_IMAGE_PIXELS = env_int("MAX_IMAGE_PIXELS", 50_000_000)
+
+# Tiled lung analysis: tile size in pixels at full resolution, overlap between neighbouring tiles
+# (as a fraction of the tile), and the share of a tile that must be tissue for it to be scored
+TILE_SIZE = env_int("TILE_SIZE", 224)
+TILE_OVERLAP = env_float("TILE_OVERLAP", 0.25)
+TISSUE_THRESHOLD = env_float("TISSUE_THRESHOLD", 0.5)
+
+# Upload previews: JPEG quality, and previews kept in memory across reruns
+PREVIEW_QUALITY = env_int("PREVIEW_QUALITY", 85)
+PREVIEW_CACHE_SIZE = env_int("PREVIEW_CACHE_SIZE", 64)
+
+# Grad-CAM explanations kept in memory, keyed by model version and image hash
+EXPLANATION_CACHE_SIZE = env_int("EXPLANATION_CACHE_SIZE", 64)
+
+# Prediction cache: entries kept in memory, and an optional directory that survives restarts
+PREDICTION_CACHE_SIZE = env_int("PREDICTION_CACHE_SIZE", 1024)
+PREDICTION_CACHE_DIR = env_str("PREDICTION_CACHE_DIR")
+
+# Inference server: when INFERENCE_URL is set, the app sends images there instead of running the models itself.
+# Requests arriving within BATCH_WINDOW_MS of each other share one forward pass of at most MAX_BATCH_SIZE images.
+INFERENCE_URL = env_str("INFERENCE_URL")
+INFERENCE_TIMEOUT = env_float("INFERENCE_TIMEOUT", 30.0)
+BATCH_WINDOW_MS = env_float("BATCH_WINDOW_MS", 10.0)
+MAX_BATCH_SIZE = env_int("MAX_BATCH_SIZE", 32)
+
+# TensorFlow execution profile: intra-op and inter-op thread pool sizes (0 = one per core), XLA JIT compilation,
+# oneDNN kernels (unset keeps TensorFlow's default), and a warm-up pass per model before the first request
+INTRA_OP_THREADS = env_int("INTRA_OP_THREADS", 0)
+INTER_OP_THREADS = env_int("INTER_OP_THREADS", 0)
+XLA_JIT = env_bool("XLA_JIT", False)
+ONEDNN = env_bool("ONEDNN", None)
+WARMUP = env_bool("WARMUP", True)
+
+# Inference backend per model, as "name=backend" pairs: "keras" (default) or "tflite"
+BACKENDS = dict(pair.split('=', 1) for pair in env_str("BACKENDS", "").split(',') if '=' in pair)
+TFLITE_THREADS = env_int("TFLITE_THREADS", None)
+TFLITE_XNNPACK = env_bool("TFLITE_XNNPACK", True)
+
+# Metrics export (Prometheus text format): a local endpoint and/or a file rewritten every METRICS_INTERVAL seconds
+METRICS_PORT = env_int("METRICS_PORT", None)
+METRICS_FILE = env_str("METRICS_FILE")
+METRICS_INTERVAL = env_float("METRICS_INTERVAL", 15.0)
+
+# Model evaluation artifacts (json_files/<model>/metrics.json): seconds between checks for a newer file
+METRICS_RELOAD_INTERVAL = env_float("METRICS_RELOAD_INTERVAL", 30.0)
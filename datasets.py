@@ -0,0 +1,44 @@
+import os
+from inference import CLASS_NAMES, index
+
+# Labeled image folders: one sub-directory per class, named either like the class labels in
+# CLASS_NAMES ("Benign", "Malignant") or with the dataset's own codes ("lung_aca", "lung_n", ...)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Dataset folder names that differ from the class labels
+CLASS_ALIASES = {
+    'leukemia': ['all', 'hem'],  # C-NMC-2019: acute lymphoblastic leukemia / normal (hematogone) cells
+    'lung': list(index),
+}
+
+# Class index of a sub-directory for a model, or None if it is not one of the model's classes
+def class_index(name, folder):
+    folder = folder.lower()
+    for labels in [CLASS_NAMES[name], CLASS_ALIASES.get(name, [])]:
+        for i, label in enumerate(labels):
+            if folder == label.lower() or folder == label.lower().replace(' ', '_'):
+                return i
+    return None
+
+# Yield (path, class index) for every image in a labeled directory, in a stable order.
+# Nothing is read up front, so any dataset size can be streamed.
+def iter_labeled_images(directory, name):
+    for folder in sorted(os.listdir(directory)):
+        label = class_index(name, folder)
+        folder_path = os.path.join(directory, folder)
+        if label is None or not os.path.isdir(folder_path):
+            continue
+        for root, dirs, files in os.walk(folder_path):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, file_name), label
+
+# Yield image paths in a directory (no labels), e.g. for calibration data
+def iter_images(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, file_name)
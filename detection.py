@@ -1,141 +1,367 @@
+import io
 import streamlit as st
-import tensorflow as tf
-from tensorflow.keras.models import load_model # type: ignore
-from PIL import Image, ImageOps
 import numpy as np
-import io
-import base64
+import pandas as pd
+from PIL import UnidentifiedImageError
 import logging
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from config import BATCH_SIZE, DETECTION_WORKERS, INFERENCE_URL, LOG_LEVEL, WARMUP
+from explain import submit_explanation
+from inference import (CANCEROUS, CLASS_NAMES, cache_key, predict_all, predict_batch, predict_leukemia_image,
+                       predict_lung_image, predict_skin_image, prediction_cache, startup_report, warm_up)
+from instrumentation import metrics, span
+from prediction_cache import image_hash
+from preprocessing import ImageTooLarge, decode_image
+from preview import make_preview
+from scheduler import SchedulerBusy
+from tiling import heatmap_image, predict_tiled
 
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-
-# Load the improved trained model for skin cancer detection
-try:
-    skin_model = load_model('models/skin_cancer_model.h5')
-    logging.info("Skin cancer model loaded successfully")
-except Exception as e:
-    logging.error(f"Error loading skin cancer model: {e}")
-    skin_model = None
-
-# Prediction function for skin cancer
-def predict_skin_image(image):
-    if skin_model is None:
-        logging.error("Skin cancer model is not loaded.")
-        return np.array([[0, 0]])
-    
-    try:
-        img = ImageOps.fit(image, (224, 224), Image.Resampling.LANCZOS)
-        img = np.asarray(img) / 255.0
-        img = np.expand_dims(img, axis=0)
-        logging.debug(f"Image shape for skin prediction: {img.shape}")
-
-        prediction = skin_model.predict(img)
-        logging.debug(f"Skin prediction: {prediction}")
-        
-        return prediction
-    except Exception as e:
-        logging.error(f"Error during skin prediction: {e}")
-        return np.array([[0, 0]])
-
-# Load the trained models
-try:
-    leukemia_model = load_model('models/leukemia_cancer_model.h5')
-    lung_model = load_model('models/lung_cancer_model.h5')
-    logging.info("Models loaded successfully")
-except Exception as e:
-    logging.error(f"Error loading models: {e}")
-    leukemia_model = None
-    lung_model = None
-    
-    # Function to convert image to base64
-def image_to_base64(image):
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    return img_str
-
-def predict_leukemia_image(image):
-    if leukemia_model is None:
-        logging.error("Leukemia model is not loaded.")
+# Configure logging (CANCER_DETECTIVE_LOG_LEVEL=DEBUG also logs every prediction)
+logging.basicConfig(level=LOG_LEVEL)
+
+# Load and warm up the models once per process, under the configured execution profile, before
+# the first upload is scored. Skipped when an inference server runs the models.
+@st.cache_resource(show_spinner="Preparing the models...")
+def prepare_models():
+    warm_up()
+    report = startup_report()
+    logging.info(f"Startup: {report}")
+    return report
+
+# Predictions run here rather than in the script thread, so the page renders the preview and a
+# progress message at once and fills the result in when it is ready
+_executor = ThreadPoolExecutor(max_workers=DETECTION_WORKERS, thread_name_prefix='detection')
+
+# Identifies one upload across reruns
+def file_id(uploaded_file):
+    return getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}-{uploaded_file.size}"
+
+# Session state for the upload currently shown in a tab. Streamlit reruns the whole page on
+# every interaction; the decoded preview and the prediction are kept here so a rerun for the
+# same upload only redraws them. A new upload replaces the state and supersedes its background
+# jobs: queued ones are cancelled, running ones finish but their result is dropped.
+def upload_state(tab, uploaded_file):
+    upload_id = file_id(uploaded_file)
+    state_key = f"{tab}_upload"
+    state = st.session_state.get(state_key)
+    if state is None or state['upload_id'] != upload_id:
+        if state is not None:
+            for key, value in state.items():
+                if key.endswith('_job'):
+                    value.cancel()
+        state = {'upload_id': upload_id}
+        st.session_state[state_key] = state
+    return state
+
+# Re-run the page once `future` finishes, polling from a fragment so the rest of the page stays
+# responsive meanwhile
+@st.fragment(run_every=0.25)
+def rerun_when_done(future):
+    if future.done():
+        st.rerun()
+
+# Failures that come from the image itself: retrying cannot help, so they are kept
+INPUT_ERRORS = (ImageTooLarge, UnidentifiedImageError)
+
+# Result of the background job in state[f"{slot}_job"], moved to state[slot] once it finishes.
+# While the job runs this shows `message` and returns None. Failures caused by the image are
+# stored in state[f"{slot}_error"] and shown on every rerun. Other failures, including the
+# scheduler turning the job away when the model is busy, are shown and not stored, so the next
+# rerun tries again.
+def job_result(state, slot, message):
+    if slot in state:
+        return state[slot]
+    if f"{slot}_error" in state:
+        st.error(f"This image cannot be analyzed. {state[f'{slot}_error']}. ⚠️")
+        return None
+    job = state[f"{slot}_job"]
+    if not job.done():
+        st.info(f"{message} ⏳")
+        rerun_when_done(job)
         return None
 
+    del state[f"{slot}_job"]
     try:
-        # Preprocess the image to match the input shape of the model
-        img = ImageOps.fit(image, (224, 224), Image.Resampling.LANCZOS)
-        img = np.asarray(img) / 255.0
-        img = np.expand_dims(img, axis=0)
-        logging.debug(f"Image shape for prediction: {img.shape}")
-
-        # Get the model prediction (assuming the output is a single float value)
-        prediction = leukemia_model.predict(img)
-        logging.debug(f"Leukemia Prediction: {prediction}")
-
-        # The prediction is a single probability value (a float), no need for indexing
-        cancerous_prob = float(prediction)  # Directly convert the prediction to a float
-        non_cancerous_prob = 1 - cancerous_prob  # Confidence for non-cancerous is the inverse
-
-        return cancerous_prob, non_cancerous_prob
-    except Exception as e:
-        logging.error(f"Error during leukemia prediction: {e}")
+        result = job.result()
+    except SchedulerBusy:
+        st.warning("The models are busy analyzing other images right now. Please try again in a moment. ⏳")
+        st.button("🔄 Retry", key=f"{slot}_retry_{state['upload_id']}")
         return None
-
-# Define the class mapping with exact cancer types
-index = {
-    'lung_aca': 'Lung Adenocarcinoma (Cancerous)',
-    'lung_n': 'Lung Benign Tissue (Non-Cancerous)',
-    'lung_scc': 'Lung Squamous Cell Carcinoma (Cancerous)'
-}
-
-def predict_lung_image(image):
-    if lung_model is None:
-        logging.error("Lung cancer model is not loaded.")
+    except INPUT_ERRORS as e:
+        logging.info("Background %s rejected the image: %s", slot, e)
+        state[f"{slot}_error"] = str(e)
+        st.error(f"This image cannot be analyzed. {e}. ⚠️")
+        return None
+    except Exception as e:
+        logging.error("Error during background %s: %s", slot, e)
+        result = None
+    if result is None:
+        st.error("The model could not analyze this image. Please try again.")
         return None
+    state[slot] = result
+    return result
+
+# Decoded image of the upload, kept only until its prediction is stored. Returns None for
+# uploads over the size limits or that cannot be read as images (the reason is kept in the
+# state and shown once per rerun).
+def upload_image(state, uploaded_file):
+    if 'image' not in state and 'error' not in state:
+        # Decoded once, already scaled down to what the model input and the 500x500 preview need
+        try:
+            state['image'] = decode_image(uploaded_file)
+        except ImageTooLarge as e:
+            state['error'] = f"It is too large. {e}"
+        except Exception as e:
+            logging.warning("Could not decode %s: %s", uploaded_file.name, e)
+            state['error'] = "It could not be read as an image"
+    return state.get('image')
+
+# Prediction for the upload, computed once per upload in the background. Returns None until
+# it is ready (or if it failed). With `explainable`, the input batch the prediction is scored on
+# is kept for a Grad-CAM explanation (`predict` must then accept a `batches` list).
+def session_prediction(state, uploaded_file, predict, message="Analyzing the image...", explainable=False):
+    if 'prediction' not in state and 'prediction_job' not in state:
+        image = upload_image(state, uploaded_file)
+        if image is None:
+            return None
+        if explainable and not INFERENCE_URL:
+            state['batches'] = []
+            state['prediction_job'] = _executor.submit(predict, image, uploaded_file.getvalue(), state['batches'])
+        else:
+            state['prediction_job'] = _executor.submit(predict, image, uploaded_file.getvalue())
+
+    prediction = job_result(state, 'prediction', message)
+    if prediction is not None:
+        state.pop('image', None)
+    return prediction
+
+# Show the uploaded image above the results, as a JPEG preview made once per upload
+def show_preview(state, uploaded_file):
+    with span('render', part='preview'):
+        if 'preview' not in state:
+            image = upload_image(state, uploaded_file)
+            if image is None:
+                st.error(f"This image cannot be analyzed. {state['error']}. ⚠️")
+                return
+            state['preview'] = make_preview(image, key=image_hash(uploaded_file.getvalue()))
+        img_base64 = state['preview']
+        metrics.increment('preview_bytes_sent', len(img_base64))
+        st.markdown(f"""
+            <div style='text-align: center;'>
+                <img src="data:image/jpeg;base64,{img_base64}" width="500" style='border-radius: 15px' 'box-shadow: 0 4px 8px 0 rgba(0, 0, 0.2, 0.2);'/>
+                <div style='margin-top: 10px; font-size: 16px; color: #666;'>🖼️ Uploaded Image</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+# Grad-CAM heatmap of the upload, on request. It is computed in the background after the result
+# is shown, so it never delays the prediction, and cached by image for everyone.
+# Not offered when an inference server runs the models, since Grad-CAM needs the Keras model here.
+def show_explanation(state, uploaded_file, name):
+    if INFERENCE_URL:
+        st.checkbox("🔍 Explain this result (Grad-CAM heatmap)", key=f"{name}_explain", disabled=True)
+        st.caption("Explanations are not available while the models run on the inference server.")
+        return
+    if not st.checkbox("🔍 Explain this result (Grad-CAM heatmap)", key=f"{name}_explain"):
+        return
+
+    if 'explanation' not in state:
+        # Empty when the prediction came from the cache; the background job then preprocesses the upload
+        batches = state.get('batches')
+        state['explanation'] = submit_explanation(name, uploaded_file.getvalue(), batches[0] if batches else None)
+    future = state['explanation']
+
+    if not future.done():
+        st.info("Computing the explanation... ⏳")
+        rerun_when_done(future)
+        return
 
     try:
-        # Preprocess the image to match the input shape of the model
-        img = ImageOps.fit(image, (224, 224), Image.Resampling.LANCZOS)
-        img = np.asarray(img) / 255.0
-        img = np.expand_dims(img, axis=0)
-        logging.debug(f"Image shape for prediction: {img.shape}")
-
-        # Get the model prediction
-        prediction = lung_model.predict(img)
-        logging.debug(f"Lung Cancer Prediction: {prediction}")
-        
-        # The prediction returns probabilities for each class
-        lung_aca_prob = prediction[0][0]  # Probability of Lung Adenocarcinoma (cancerous)
-        lung_n_prob = prediction[0][1]    # Probability of Lung Benign Tissue (non-cancerous)
-        lung_scc_prob = prediction[0][2]  # Probability of Lung Squamous Cell Carcinoma (cancerous)
-
-        # Get the class index with the highest probability
-        predicted_class_index = np.argmax(prediction, axis=1)[0]
-
-        # Map the predicted class index to the corresponding cancer type
-        if predicted_class_index == 0:  # lung_aca
-            predicted_class = 'Lung Adenocarcinoma'
-            cancer_status = 'Cancerous'
-        elif predicted_class_index == 1:  # lung_n
-            predicted_class = 'Lung Benign Tissue'
-            cancer_status = 'Non-Cancerous'
-        elif predicted_class_index == 2:  # lung_scc
-            predicted_class = 'Lung Squamous Cell Carcinoma'
-            cancer_status = 'Cancerous'
-
-        return predicted_class, cancer_status, lung_aca_prob, lung_n_prob, lung_scc_prob
+        explanation = future.result()
+    except SchedulerBusy:
+        st.warning("The model is busy right now, so the explanation could not be computed. Please try again in a moment. ⏳")
+        state.pop('explanation', None)
+        return
     except Exception as e:
-        logging.error(f"Error during lung cancer prediction: {e}")
-        return None
+        logging.error("Error explaining the %s prediction: %s", name, e)
+        st.error("The explanation could not be computed. ⚠️")
+        state.pop('explanation', None)
+        return
+    st.image(explanation['overlay'], width=500,
+             caption=f"Regions that drove the {explanation['class']} result "
+                     f"(heatmap computed in {explanation['seconds']:.2f}s, after the prediction)")
+
+# Score a batch of uploads: {'results': table or None, 'skipped': warnings about left-out files}.
+# Returns None, after showing why, if the batch could not be scored and should be tried again.
+def score_batch(name, uploaded_files, batch_size):
+    # Images scored before (by anyone, with the same model version) come straight from the cache
+    keys = [cache_key(name, f.getvalue()) for f in uploaded_files]
+    probabilities = [prediction_cache.get(key) if key is not None else None for key in keys]
+    missing = [i for i, p in enumerate(probabilities) if p is None]
+    skipped = []
+
+    if missing:
+        # Decoded lazily as the batches are formed; files over the size limits or that cannot be
+        # read as images are left out and listed, so one bad file doesn't fail the whole batch
+        decoded, too_large, unreadable = [], [], []
+        def images():
+            for i in missing:
+                try:
+                    image = decode_image(uploaded_files[i])
+                except ImageTooLarge as e:
+                    too_large.append(f"{uploaded_files[i].name}: {e}")
+                    continue
+                except Exception as e:
+                    logging.warning("Could not decode %s: %s", uploaded_files[i].name, e)
+                    unreadable.append(uploaded_files[i].name)
+                    continue
+                decoded.append(i)
+                yield image
+
+        with st.spinner(f"Analyzing {len(missing)} images..."):
+            try:
+                scored = predict_batch(name, images(), batch_size=batch_size)
+            except SchedulerBusy:
+                st.warning("The model is busy analyzing other images right now. Please try again in a moment. ⏳")
+                return None
+
+        if scored is None:
+            st.error("The model could not analyze these images. Please try again.")
+            return None
+        if too_large:
+            skipped.append("Skipped images that are too large to analyze:\n\n" + "\n\n".join(too_large))
+        if unreadable:
+            skipped.append("Skipped files that could not be read as images:\n\n" + "\n\n".join(unreadable))
+
+        for i, p in zip(decoded, scored):
+            probabilities[i] = p
+            if keys[i] is not None:
+                prediction_cache.put(keys[i], p)
+
+    files = [f for f, p in zip(uploaded_files, probabilities) if p is not None]
+    if not files:
+        return {'results': None, 'skipped': skipped}
+    probabilities = np.stack([p for p in probabilities if p is not None])
+    classes = CLASS_NAMES[name]
+    predicted = probabilities.argmax(axis=1)
+    results = pd.DataFrame({
+        'File': [f.name for f in files],
+        'Prediction': [classes[i] for i in predicted],
+        'Status': ['Cancerous' if CANCEROUS[name][i] else 'Non-Cancerous' for i in predicted],
+    })
+    for i, class_name in enumerate(classes):
+        results[f"{class_name} (%)"] = (probabilities[:, i] * 100).round(2)
+    return {'results': results, 'skipped': skipped}
+
+# Multi-file upload for one tab: scores every file in batches and shows a sortable table.
+# The results are kept in session state for the current set of files, like a single upload's
+# prediction, so a rerun only redraws the table instead of hashing and scoring the files again.
+def batch_section(name, label, file_types):
+    if not st.checkbox("📁 Batch mode (analyze multiple images at once)", key=f"{name}_batch_mode"):
+        return
+
+    uploaded_files = st.file_uploader(label, type=file_types, accept_multiple_files=True, key=f"{name}_batch_files")
+    batch_size = st.number_input("Batch size", min_value=1, max_value=256, value=BATCH_SIZE, key=f"{name}_batch_size")
+
+    if not uploaded_files:
+        return
+
+    file_ids = frozenset(file_id(f) for f in uploaded_files)
+    state_key = f"{name}_batch"
+    state = st.session_state.get(state_key)
+    if state is None or state['file_ids'] != file_ids:
+        state = score_batch(name, uploaded_files, int(batch_size))
+        if state is None:
+            return
+        state['file_ids'] = file_ids
+        st.session_state[state_key] = state
+
+    with span('render', part='batch', model=name):
+        for message in state['skipped']:
+            st.warning(message)
+        if state['results'] is not None:
+            st.dataframe(state['results'], use_container_width=True, hide_index=True)
+
+# Tiled lung analysis of the upload, computed once per upload like the regular prediction
+def show_tiled_analysis(state, uploaded_file):
+    # Uploads that could not be decoded were already reported by the preview
+    if state.get('error'):
+        return
+    if 'tiled' not in state and 'tiled_job' not in state and 'tiled_error' not in state:
+        state['tiled_job'] = _executor.submit(predict_tiled, io.BytesIO(uploaded_file.getvalue()))
+    result = job_result(state, 'tiled', "Analyzing the image tile by tile...")
+    if result is None:
+        return
+
+    with span('render', part='tiled', model='lung'):
+        if result['probabilities'] is None:
+            st.warning("No tissue was found in this image. ⚠️")
+            return
+
+        rows = [{'Tissue Type': class_name, 'Probability (%)': round(float(p) * 100, 2)}
+                for class_name, p in zip(CLASS_NAMES['lung'], result['probabilities'])]
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        st.image(heatmap_image(result), caption=f"Cancer probability per tile ({result['tiles']} tissue tiles, "
+                                                f"{result['background_tiles']} background tiles skipped)")
+
+        if result['status'] == "Cancerous":
+            st.markdown(f"""
+                <div class="cprob">
+                    <h3 style='color: #eb1948;'>🚨 Lung Cancer Detected ({result['status']})</h3>
+                    <p style='color: #0F0F0F;'>Cancer Type: {result['predicted_class']}</p>
+                </div>
+            """, unsafe_allow_html=True)
+            st.error("Please seek immediate medical attention for diagnosis and treatment options. 🚑⚠️")
+        else:
+            st.markdown(f"""
+                <div class="ncprob">
+                    <h3 style='color: #00f731;'>✅ No Lung Cancer Detected ({result['status']})</h3>
+                    <p style='color: #0F0F0F;'>Tissue Type: {result['predicted_class']}</p>
+                </div>
+            """, unsafe_allow_html=True)
+            st.success("Maintain a healthy lifestyle and consider regular check-ups. 🥗💪")
+
+# Display names of the models in the combined report
+MODEL_TITLES = {
+    'leukemia': '🧪 Leukemia',
+    'lung': '🫁 Lung Cancer',
+    'skin': '📸 Skin Cancer',
+}
+
+# One report for an image scored by every model
+def show_scan_report(results):
+    with span('render', part='result', model='all'):
+        rows = []
+        for name, probabilities in results.items():
+            if probabilities is None:
+                rows.append({'Model': MODEL_TITLES[name], 'Prediction': 'Unavailable', 'Status': '-', 'Confidence (%)': None})
+                continue
+            predicted = int(np.argmax(probabilities))
+            rows.append({
+                'Model': MODEL_TITLES[name],
+                'Prediction': CLASS_NAMES[name][predicted],
+                'Status': 'Cancerous' if CANCEROUS[name][predicted] else 'Non-Cancerous',
+                'Confidence (%)': round(float(probabilities[predicted]) * 100, 2),
+            })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+        flagged = [row['Model'] for row in rows if row['Status'] == 'Cancerous']
+        if flagged:
+            st.error(f"Possible findings from: {', '.join(flagged)}. Please consult a healthcare professional. 🩺")
+        else:
+            st.success("No model detected signs of cancer in this image. ✅")
 
 def app():
     st.markdown('<h1 class="title-font">📸 Detection Page</h1>', unsafe_allow_html=True)
 
+    if WARMUP and not INFERENCE_URL:
+        prepare_models()
+
     # Tabs for different cancer types
-    tabs = st.tabs(["Leukemia Detection", "Lung Cancer Detection", "Skin Cancer Detection"])
+    tabs = st.tabs(["Leukemia Detection", "Lung Cancer Detection", "Skin Cancer Detection", "Scan with All Models"])
 
     with tabs[0]:
         st.header("🧪 Leukemia Detection (For Medical Professionals Only)")
@@ -166,48 +392,46 @@ def app():
         uploaded_file = st.file_uploader("Choose a leukemia image...", type=["jpg", "jpeg", "png", "bmp"])
 
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            image = image.resize((500, 500))
-            img_base64 = image_to_base64(image)
-            st.markdown(f"""
-                <div style='text-align: center;'>
-                    <img src="data:image/png;base64,{img_base64}" width="500" style='border-radius: 15px' 'box-shadow: 0 4px 8px 0 rgba(0, 0, 0.2, 0.2);'/>
-                    <div style='margin-top: 10px; font-size: 16px; color: #666;'>🖼️ Uploaded Image</div>
-                </div>
-                """, unsafe_allow_html=True)
+            state = upload_state('leukemia', uploaded_file)
+            show_preview(state, uploaded_file)
 
-            prediction = predict_leukemia_image(image)
+            prediction = session_prediction(state, uploaded_file, predict_leukemia_image, explainable=True)
 
             if prediction is not None:
-                cancerous_prob, non_cancerous_prob = prediction
+                with span('render', part='result', model='leukemia'):
+                    cancerous_prob, non_cancerous_prob = prediction
 
-                # Display confidence for both cancerous and non-cancerous
-                st.markdown(f"""
-                            <div class='dmain'>
-                                <p><strong>Cancerous Probability:<strong> {cancerous_prob * 100:.2f}%</p>
-                                <p><strong>Non-Cancerous Probability:<strong> {non_cancerous_prob * 100:.2f}%</p>
+                    # Display confidence for both cancerous and non-cancerous
+                    st.markdown(f"""
+                                <div class='dmain'>
+                                    <p><strong>Cancerous Probability:<strong> {cancerous_prob * 100:.2f}%</p>
+                                    <p><strong>Non-Cancerous Probability:<strong> {non_cancerous_prob * 100:.2f}%</p>
+                                </div>
+                                    """, unsafe_allow_html=True)
+
+                    threshold = 0.5
+
+                    if cancerous_prob > threshold:
+                        st.markdown(f"""
+                            <div class="cprob">
+                                <h3 style='color: #eb1948;'>🚨 Leukemia Detected</h3>
+                                <p style='color: #0F0F0F;'>Detection: Cancerous (Confidence: {cancerous_prob * 100:.2f}%)</p>
+                            </div>
+                        """, unsafe_allow_html=True)
+                        st.error("Please consult with a healthcare professional for further tests and treatments. 🩺📅")
+                    else:
+                        st.markdown(f"""
+                            <div class="ncprob">
+                                <h3 style='color: #00f731;'>✅ No Leukemia Detected</h3>
+                                <p style='color: #0F0F0F;'>Detection: Non-Cancerous (Confidence: {non_cancerous_prob * 100:.2f}%)</p>
+                                <p style='color: #0F0F0F;'>Advice: Keep monitoring your health regularly. 📊🩸</p>
                             </div>
-                                """, unsafe_allow_html=True)
+                        """, unsafe_allow_html=True)
+                        st.success("Keep monitoring your health regularly. 📊🩸")
 
-                threshold = 0.5
+                    show_explanation(state, uploaded_file, 'leukemia')
 
-                if cancerous_prob > threshold:
-                    st.markdown(f"""
-                        <div class="cprob">
-                            <h3 style='color: #eb1948;'>🚨 Leukemia Detected</h3>
-                            <p style='color: #0F0F0F;'>Detection: Cancerous (Confidence: {cancerous_prob * 100:.2f}%)</p>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    st.error("Please consult with a healthcare professional for further tests and treatments. 🩺📅")
-                else:
-                    st.markdown(f"""
-                        <div class="ncprob">
-                            <h3 style='color: #00f731;'>✅ No Leukemia Detected</h3>
-                            <p style='color: #0F0F0F;'>Detection: Non-Cancerous (Confidence: {non_cancerous_prob * 100:.2f}%)</p>
-                            <p style='color: #0F0F0F;'>Advice: Keep monitoring your health regularly. 📊🩸</p>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    st.success("Keep monitoring your health regularly. 📊🩸")
+        batch_section('leukemia', "Choose leukemia images...", ["jpg", "jpeg", "png", "bmp"])
 
     with tabs[1]:
         st.header("🫁 Lung Cancer Detection")
@@ -237,46 +461,55 @@ def app():
         uploaded_file = st.file_uploader("Choose a lung image...", type=["jpg", "jpeg", "png"])
     
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            image = image.resize((500, 500))
-            img_base64 = image_to_base64(image)
-            st.markdown(f"""
-                <div style='text-align: center;'>
-                    <img src="data:image/png;base64,{img_base64}" width="500" style='border-radius: 15px' 'box-shadow: 0 4px 8px 0 rgba(0, 0, 0.2, 0.2);'/>
-                    <div style='margin-top: 10px; font-size: 16px; color: #666;'>🖼️ Uploaded Image</div>
-                </div>
-                """, unsafe_allow_html=True)
-    
-            prediction = predict_lung_image(image)
+            state = upload_state('lung', uploaded_file)
+            show_preview(state, uploaded_file)
+
+            # Tiling needs the full-resolution image and the model in this process, so it is not
+            # offered when an inference server runs the models
+            tiled = st.checkbox("🔬 Tiled analysis (large histopathology images)", key="lung_tiled",
+                                disabled=bool(INFERENCE_URL),
+                                help="Score the image tile by tile at full resolution instead of shrinking it to 224x224")
+            if INFERENCE_URL:
+                st.caption("Tiled analysis is not available while the models run on the inference server.")
+            if tiled and not INFERENCE_URL:
+                show_tiled_analysis(state, uploaded_file)
+                prediction = None
+            else:
+                prediction = session_prediction(state, uploaded_file, predict_lung_image, explainable=True)
     
             if prediction is not None:
-                predicted_class, cancer_status, lung_aca_prob, lung_n_prob, lung_scc_prob = prediction
+                with span('render', part='result', model='lung'):
+                    predicted_class, cancer_status, lung_aca_prob, lung_n_prob, lung_scc_prob = prediction
     
-                st.markdown(f"""
-                            <div class='dmain'>
-                                <p><strong>Lung Adenocarcinoma (Cancerous):</strong> {lung_aca_prob * 100:.2f}%</p>
-                                <p><strong>Lung Squamous Cell Carcinoma (Cancerous):</strong> {lung_scc_prob * 100:.2f}%</p>
-                                <p><strong>Lung Benign Tissue (Non-Cancerous):</strong> {lung_n_prob * 100:.2f}%</p>
+                    st.markdown(f"""
+                                <div class='dmain'>
+                                    <p><strong>Lung Adenocarcinoma (Cancerous):</strong> {lung_aca_prob * 100:.2f}%</p>
+                                    <p><strong>Lung Squamous Cell Carcinoma (Cancerous):</strong> {lung_scc_prob * 100:.2f}%</p>
+                                    <p><strong>Lung Benign Tissue (Non-Cancerous):</strong> {lung_n_prob * 100:.2f}%</p>
+                                </div>
+                            """, unsafe_allow_html=True)
+    
+                    # Display result with custom message
+                    if cancer_status == "Cancerous":
+                        st.markdown(f"""
+                            <div class="cprob">
+                                <h3 style='color: #eb1948;'>🚨 Lung Cancer Detected ({cancer_status})</h3>
+                                <p style='color: #0F0F0F;'>Cancer Type: {predicted_class}</p>
                             </div>
                         """, unsafe_allow_html=True)
-    
-                # Display result with custom message
-                if cancer_status == "Cancerous":
-                    st.markdown(f"""
-                        <div class="cprob">
-                            <h3 style='color: #eb1948;'>🚨 Lung Cancer Detected ({cancer_status})</h3>
-                            <p style='color: #0F0F0F;'>Cancer Type: {predicted_class}</p>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    st.error("Please seek immediate medical attention for diagnosis and treatment options. 🚑⚠️")
-                else:
-                    st.markdown(f"""
-                        <div class="ncprob">
-                            <h3 style='color: #00f731;'>✅ No Lung Cancer Detected ({cancer_status})</h3>
-                            <p style='color: #0F0F0F;'>Tissue Type: {predicted_class}</p>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    st.success("Maintain a healthy lifestyle and consider regular check-ups. 🥗💪")
+                        st.error("Please seek immediate medical attention for diagnosis and treatment options. 🚑⚠️")
+                    else:
+                        st.markdown(f"""
+                            <div class="ncprob">
+                                <h3 style='color: #00f731;'>✅ No Lung Cancer Detected ({cancer_status})</h3>
+                                <p style='color: #0F0F0F;'>Tissue Type: {predicted_class}</p>
+                            </div>
+                        """, unsafe_allow_html=True)
+                        st.success("Maintain a healthy lifestyle and consider regular check-ups. 🥗💪")
+
+                    show_explanation(state, uploaded_file, 'lung')
+
+        batch_section('lung', "Choose lung images...", ["jpg", "jpeg", "png"])
                 
     with tabs[2]:
         st.header("📸 Skin Cancer Detection")
@@ -308,45 +541,75 @@ def app():
         uploaded_file = st.file_uploader("Choose a skin image...", type=["jpg", "jpeg", "png"])
 
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            image = image.resize((500, 500))
-            img_base64 = image_to_base64(image)
-            st.markdown(f"""
-                <div style='text-align: center;'>
-                    <img src="data:image/png;base64,{img_base64}" width="500" style='border-radius: 15px' 'box-shadow: 0 4px 8px 0 rgba(0, 0, 0.2, 0.2);'/>
-                    <div style='margin-top: 10px; font-size: 16px; color: #666;'>🖼️ Uploaded Image</div>
-                </div>
-                """, unsafe_allow_html=True)
+            state = upload_state('skin', uploaded_file)
+            show_preview(state, uploaded_file)
 
-            prediction = predict_skin_image(image)
+            prediction = session_prediction(state, uploaded_file, predict_skin_image, explainable=True)
 
             if prediction is not None:
-                benign_prob = prediction[0][0]
-                malignant_prob = prediction[0][1]
-                st.markdown(f"""
-                            <div class='dmain'>
-                                <p><strong>Benign Probability:</strong> {benign_prob * 100:.2f}%</p>
-                                <p><strong>Malignant Probability:</strong> {malignant_prob * 100:.2f}%</p>
-                            </div>
-                                """, unsafe_allow_html=True)
+                with span('render', part='result', model='skin'):
+                    benign_prob = prediction[0][0]
+                    malignant_prob = prediction[0][1]
+                    st.markdown(f"""
+                                <div class='dmain'>
+                                    <p><strong>Benign Probability:</strong> {benign_prob * 100:.2f}%</p>
+                                    <p><strong>Malignant Probability:</strong> {malignant_prob * 100:.2f}%</p>
+                                </div>
+                                    """, unsafe_allow_html=True)
                     
-                threshold = 0.5
+                    threshold = 0.5
                 
-                if malignant_prob > threshold:
-                    st.markdown(f"""
-                        <div class="cprob">
-                            <h3 style='color: #eb1948;'>🚨 Skin Cancer Detected</h3>
-                            <p style='color: #0F0F0F;'>Detection: Malignant (Confidence: {malignant_prob * 100:.2f}%)</p>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    st.error("Please consult a dermatologist immediately for a thorough examination. 🧴🔍")
-                else:
-                    st.markdown(f"""
-                        <div class="ncprob">
-                            <h3 style='color: #00f731;'>✅ No Skin Cancer Detected</h3>
-                            <p style='color: #0F0F0F;'>Detection: Benign (Confidence: {benign_prob * 100:.2f}%)</p>
-                    """, unsafe_allow_html=True)
-                    st.success("Continue regular skin checks and maintain good skincare practices. 🧖‍♀️🧴")
+                    if malignant_prob > threshold:
+                        st.markdown(f"""
+                            <div class="cprob">
+                                <h3 style='color: #eb1948;'>🚨 Skin Cancer Detected</h3>
+                                <p style='color: #0F0F0F;'>Detection: Malignant (Confidence: {malignant_prob * 100:.2f}%)</p>
+                            </div>
+                        """, unsafe_allow_html=True)
+                        st.error("Please consult a dermatologist immediately for a thorough examination. 🧴🔍")
+                    else:
+                        st.markdown(f"""
+                            <div class="ncprob">
+                                <h3 style='color: #00f731;'>✅ No Skin Cancer Detected</h3>
+                                <p style='color: #0F0F0F;'>Detection: Benign (Confidence: {benign_prob * 100:.2f}%)</p>
+                        """, unsafe_allow_html=True)
+                        st.success("Continue regular skin checks and maintain good skincare practices. 🧖‍♀️🧴")
+
+                    show_explanation(state, uploaded_file, 'skin')
+
+        batch_section('skin', "Choose skin images...", ["jpg", "jpeg", "png"])
+
+    with tabs[3]:
+        st.header("🔎 Scan with All Models")
+        st.markdown("""
+                **🔍 Not sure which model applies?** 
+
+                Upload one image and it will be analyzed by the leukemia, lung cancer and skin cancer models at once.
+                """)
+        with st.expander("See More Details"):
+            st.markdown("""
+                        ### How It Works:
+                        - **Upload:** 
+                        Upload any supported medical image once. 📤
+
+                        - **Analyze:** 
+                        The image is prepared a single time and all three models analyze it in parallel. ⚡
+
+                        - **Get Insights:** 
+                        See every model's result side by side in one report. 💡
+
+                        Only the model trained for your kind of image gives a meaningful result. 🩺
+                        """)
+
+        uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png", "bmp"], key="scan_all_file")
+
+        if uploaded_file is not None:
+            state = upload_state('scan_all', uploaded_file)
+            show_preview(state, uploaded_file)
+
+            results = session_prediction(state, uploaded_file, predict_all, "Analyzing with all models...")
+            if results is not None:
+                show_scan_report(results)
 
 if __name__ == "__main__":
     app()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+import numpy as np
+from config import BATCH_SIZE, LOG_LEVEL
+from datasets import iter_labeled_images
+from inference import CLASS_NAMES, predict_batch
+from metrics_store import METRICS_PATHS, metrics_store
+from preprocessing import decode_image
+
+# Streaming evaluation on a labeled directory (one sub-directory per class). Images go through
+# the same decode, preprocessing and predict path as the Detection page, in batches spread over
+# worker processes. Only counters are kept, so memory stays flat for any dataset size.
+#
+#   python evaluate.py skin data/skin/test --workers 4
+#
+# The results update json_files/<model>/metrics.json, the file the Visualizing page reads.
+
+# Smallest probability used in the log loss, so a confident miss doesn't give an infinite loss
+EPSILON = 1e-7
+
+def _init_worker(log_level):
+    logging.basicConfig(level=log_level)
+
+# Score one chunk of (path, label) pairs: returns (confusion matrix, summed log loss, failed images).
+# Runs in a worker process, which loads the model once on its first chunk.
+def evaluate_chunk(name, chunk):
+    num_classes = len(CLASS_NAMES[name])
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+
+    images, labels, failed = [], [], 0
+    for path, label in chunk:
+        try:
+            images.append(decode_image(path))
+            labels.append(label)
+        except Exception as e:
+            logging.warning(f"Skipping {path}: {e}")
+            failed += 1
+    if not images:
+        return confusion, 0.0, failed
+
+    probabilities = predict_batch(name, images, batch_size=len(images))
+    if probabilities is None:
+        raise RuntimeError(f"Prediction with the {name} model failed")
+
+    labels = np.array(labels)
+    np.add.at(confusion, (labels, probabilities.argmax(axis=1)), 1)
+    loss = float(-np.log(np.clip(probabilities[np.arange(len(labels)), labels], EPSILON, 1.0)).sum())
+    return confusion, loss, failed
+
+# Stream the dataset through `workers` processes, at most two chunks per worker in flight
+def evaluate(name, directory, batch_size=BATCH_SIZE, workers=1):
+    num_classes = len(CLASS_NAMES[name])
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    loss = 0.0
+    failed = 0
+
+    samples = iter_labeled_images(directory, name)
+    chunks = iter(lambda: list(islice(samples, batch_size)), [])
+
+    def add(result):
+        nonlocal confusion, loss, failed
+        chunk_confusion, chunk_loss, chunk_failed = result
+        confusion += chunk_confusion
+        loss += chunk_loss
+        failed += chunk_failed
+        logging.info(f"{name}: {int(confusion.sum())} images evaluated")
+
+    start = time.perf_counter()
+    if workers <= 1:
+        for chunk in chunks:
+            add(evaluate_chunk(name, chunk))
+    else:
+        # Spawned rather than forked: TensorFlow does not survive a fork
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker, initargs=(LOG_LEVEL,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(evaluate_chunk, (name, chunk)))
+                if len(pending) >= 2 * workers:
+                    add(pending.popleft().get())
+            while pending:
+                add(pending.popleft().get())
+    seconds = time.perf_counter() - start
+
+    total = int(confusion.sum())
+    if total == 0:
+        raise ValueError(f"No labeled images for the {name} model in {directory}")
+
+    correct = np.diag(confusion)
+    predicted = confusion.sum(axis=0)
+    actual = confusion.sum(axis=1)
+    return {
+        'model': name,
+        'class_names': CLASS_NAMES[name],
+        'test_accuracy': float(correct.sum() / total),
+        'test_loss': loss / total,
+        'confusion_matrix': confusion.tolist(),
+        'precision': [float(correct[i] / predicted[i]) if predicted[i] else None for i in range(num_classes)],
+        'recall': [float(correct[i] / actual[i]) if actual[i] else None for i in range(num_classes)],
+        'test_images': total,
+        'failed_images': failed,
+        'evaluated_at': datetime.now(timezone.utc).isoformat(),
+        'images_per_second': round(total / seconds, 2) if seconds else None,
+    }
+
+# Merge the results into the model's metrics file, keeping the training history
+def publish(name, results):
+    try:
+        current, _ = metrics_store.get(name)
+    except (OSError, ValueError):
+        current = {}
+    metrics_store.save(name, {**current, **{key: value for key, value in results.items() if key != 'images_per_second'}})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a model on a labeled image directory.")
+    parser.add_argument('model', choices=sorted(METRICS_PATHS))
+    parser.add_argument('directory', help="Labeled directory with one sub-directory per class")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes, each with its own copy of the model")
+    parser.add_argument('--dry-run', action='store_true', help="Print the results without updating the metrics file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=LOG_LEVEL)
+    results = evaluate(args.model, args.directory, args.batch_size, args.workers)
+    print(json.dumps(results, indent=4))
+
+    if not args.dry_run:
+        publish(args.model, results)
+        logging.info(f"Updated {METRICS_PATHS[args.model]}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
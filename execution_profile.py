@@ -0,0 +1,83 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import numpy as np
+from config import INTER_OP_THREADS, INTRA_OP_THREADS, ONEDNN, XLA_JIT
+
+# CPU execution profile for TensorFlow. oneDNN is chosen when TensorFlow is imported, so modules
+# that import TensorFlow import this module first; thread pools and XLA JIT must be set before
+# the runtime starts, so apply_profile() runs before the first model is loaded.
+#
+#   CANCER_DETECTIVE_INTRA_OP_THREADS=4 CANCER_DETECTIVE_INTER_OP_THREADS=1 python execution_profile.py
+
+if ONEDNN is not None:
+    if 'tensorflow' in sys.modules:
+        logging.warning("TensorFlow was imported before the execution profile; the oneDNN setting is ignored")
+    os.environ['TF_ENABLE_ONEDNN_OPTS'] = '1' if ONEDNN else '0'
+
+_applied = False
+_lock = threading.Lock()
+
+# Set the thread pools and XLA JIT once per process. Threads left unset (0) keep TensorFlow's
+# default of one per core, which oversubscribes the CPU when several sessions predict at once.
+def apply_profile():
+    global _applied
+    with _lock:
+        if _applied:
+            return
+        _applied = True
+
+    # Imported here so this module itself can be imported before TensorFlow
+    import tensorflow as tf
+    try:
+        if INTRA_OP_THREADS:
+            tf.config.threading.set_intra_op_parallelism_threads(INTRA_OP_THREADS)
+        if INTER_OP_THREADS:
+            tf.config.threading.set_inter_op_parallelism_threads(INTER_OP_THREADS)
+    except RuntimeError as e:
+        logging.warning(f"Could not set the TensorFlow thread pools, the runtime is already running: {e}")
+    if XLA_JIT:
+        tf.config.optimizer.set_jit(True)
+    logging.info(f"Execution profile: {profile()}")
+
+# Settings in effect, for reports
+def profile():
+    import tensorflow as tf
+    return {
+        'intra_op_threads': tf.config.threading.get_intra_op_parallelism_threads(),
+        'inter_op_threads': tf.config.threading.get_inter_op_parallelism_threads(),
+        'xla_jit': bool(tf.config.optimizer.get_jit()),
+        'onednn': os.environ.get('TF_ENABLE_ONEDNN_OPTS', 'default'),
+        'cpu_count': os.cpu_count(),
+    }
+
+# Load and warm up every model under the current profile, then time one more request per model
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report model warm-up and first-request latency under the configured execution profile.")
+    parser.add_argument('--output', help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # Imported here: these modules import this one
+    from backends import get_backend
+    from inference import CLASS_NAMES, run_model, startup_report, warm_up
+
+    warm_up()
+    for name in CLASS_NAMES:
+        backend = get_backend(name)
+        if backend is not None:
+            width, height = backend.input_size
+            run_model(name, backend, np.zeros((1, height, width, 3), dtype=np.float32))
+
+    report = startup_report()
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import io
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from tf_runtime import tf
+from PIL import Image
+from config import EXPLANATION_CACHE_SIZE, PREVIEW_QUALITY
+from inference import CLASS_NAMES, cache_key, to_probabilities
+from instrumentation import metrics, span
+from model_registry import registry
+from preprocessing import decode_image, model_input_size, to_batch
+from preview import PREVIEW_SIZE
+from scheduler import scheduler
+
+# Grad-CAM explanations: which regions of an image drove a model's predicted class. Computed on
+# the Keras model (whatever backend serves predictions), in a background thread so the class result
+# is never held up, and cached by model version and image hash.
+
+# Index of the last layer producing a spatial feature map (n x height x width x channels)
+def feature_layer_index(model):
+    for i in reversed(range(len(model.layers))):
+        layer = model.layers[i]
+        if not isinstance(layer, tf.keras.layers.InputLayer) and len(layer.output.shape) == 4:
+            return i
+    raise ValueError(f"{model.name} has no convolutional feature map to explain")
+
+_gradient_models = weakref.WeakKeyDictionary()
+_gradient_models_lock = threading.Lock()
+
+# Functional model returning the feature map alongside the output, built once per loaded model.
+# None when the feature layer is not connected to the model's inputs, as for a Sequential model
+# whose convolutional backbone is nested as one layer.
+def gradient_model(model, feature_index):
+    with _gradient_models_lock:
+        if model not in _gradient_models:
+            try:
+                _gradient_models[model] = tf.keras.Model(model.inputs, [model.layers[feature_index].output, model.output])
+            except (AttributeError, ValueError) as e:
+                logging.debug(f"{model.name} has no connected feature map, replaying its layers instead: {e}")
+                _gradient_models[model] = None
+        return _gradient_models[model]
+
+# Fallback forward pass returning the feature map and the output, for models without a
+# connected feature map: their layers form a chain (the nested backbone, then the
+# classification head), so they are applied in order.
+def forward(model, batch, feature_index):
+    x = batch
+    features = None
+    for i, layer in enumerate(model.layers):
+        if isinstance(layer, tf.keras.layers.InputLayer):
+            continue
+        x = layer(x, training=False)
+        if i == feature_index:
+            features = x
+    return features, x
+
+# Grad-CAM map (feature map height x width, scaled to [0, 1]) for the predicted class of a
+# one-image batch, and that class's index
+def grad_cam(name, model, batch):
+    feature_index = feature_layer_index(model)
+    submodel = gradient_model(model, feature_index)
+    inputs = tf.convert_to_tensor(batch)
+    with tf.GradientTape() as tape:
+        if submodel is not None:
+            features, output = submodel(inputs, training=False)
+        else:
+            features, output = forward(model, inputs, feature_index)
+        tape.watch(features)
+        class_index = int(np.argmax(to_probabilities(name, output)[0]))
+        if output.shape[-1] == 1:
+            # The leukemia model has one sigmoid output (Cancerous); Non-Cancerous is its complement
+            score = output[0, 0] if class_index == 0 else 1 - output[0, 0]
+        else:
+            score = output[0, class_index]
+
+    gradients = tape.gradient(score, features)
+    weights = tf.reduce_mean(gradients, axis=(1, 2))
+    cam = tf.nn.relu(tf.reduce_sum(features * weights[:, None, None, :], axis=-1))[0].numpy()
+    peak = cam.max()
+    return (cam / peak if peak > 0 else cam), class_index
+
+# The heatmap blended over the image at preview size, as JPEG bytes
+def overlay(image, cam, quality=PREVIEW_QUALITY):
+    base = image.resize(PREVIEW_SIZE)
+    mask = Image.fromarray((cam * 255 * 0.6).astype(np.uint8), 'L').resize(PREVIEW_SIZE, Image.Resampling.BILINEAR)
+    highlighted = Image.composite(Image.new('RGB', PREVIEW_SIZE, (0xeb, 0x19, 0x48)), base, mask)
+    buffered = io.BytesIO()
+    highlighted.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+# The image in a one-image float32 batch (scaled to [0, 1]), to draw the heatmap over
+def batch_image(batch):
+    return Image.fromarray((np.asarray(batch[0]) * 255).round().astype(np.uint8), 'RGB')
+
+# Explanation of one upload: {'class': predicted class, 'overlay': JPEG bytes, 'seconds': Grad-CAM time}.
+# `batch` is the input batch its prediction was scored on, when there is one; otherwise (a cached
+# prediction, or a model expecting another input size) the upload is decoded and preprocessed
+# here, in the background, exactly as for prediction.
+def explain(name, image_bytes, batch=None):
+    model = registry.get(name)
+    if model is None:
+        raise RuntimeError(f"Could not load the {name} model")
+
+    width, height = model_input_size(model)
+    if batch is None or batch.shape[1:3] != (height, width):
+        batch = to_batch([decode_image(io.BytesIO(image_bytes))], size=(width, height))
+    # Admitted like a prediction, so explanations count against the model's concurrency limit
+    with scheduler.admit(name), registry.holding(name, 'explain'):
+        start = time.perf_counter()
+        with span('explain', model=name):
+            cam, class_index = grad_cam(name, model, batch)
+    seconds = time.perf_counter() - start
+    logging.info(f"{name} Grad-CAM computed in {seconds:.2f}s")
+    return {'class': CLASS_NAMES[name][class_index], 'overlay': overlay(batch_image(batch), cam), 'seconds': seconds}
+
+_explanations = OrderedDict()
+_in_flight = {}
+_lock = threading.Lock()
+# One worker: explanations are a side feature and must not compete with predictions for the CPU
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explain')
+
+def _explain_and_cache(name, image_bytes, batch, key):
+    try:
+        result = explain(name, image_bytes, batch)
+        if key is not None:
+            with _lock:
+                _explanations[key] = result
+                while len(_explanations) > EXPLANATION_CACHE_SIZE:
+                    _explanations.popitem(last=False)
+        return result
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+
+# Start explaining an upload in the background and return a Future of explain()'s result.
+# Explanations are cached by the upload's bytes; cached ones come back as a completed Future, and
+# an image already being explained shares the running job.
+def submit_explanation(name, image_bytes, batch=None):
+    key = cache_key(name, image_bytes)
+    with _lock:
+        if key in _explanations:
+            _explanations.move_to_end(key)
+            metrics.increment('explanation_cache_hits', model=name)
+            future = Future()
+            future.set_result(_explanations[key])
+            return future
+        if key is not None and key in _in_flight:
+            return _in_flight[key]
+        future = _executor.submit(_explain_and_cache, name, image_bytes, batch, key)
+        if key is not None:
+            _in_flight[key] = future
+        return future
@@ -1,33 +1,37 @@
+import io
+import os
 import streamlit as st
 from PIL import Image, ImageDraw
 
-def app():
-    # Function to round the corners of the image
-    def round_corners(image, radius=15):
-        width, height = image.size
-        rounded_mask = Image.new('L', (width, height), 0)
-        draw = ImageDraw.Draw(rounded_mask)
-        draw.rounded_rectangle((0, 0, width, height), radius=radius, fill=255)
-
-        # Create a new image with transparency and paste the original image onto it
-        rounded_image = Image.new('RGBA', (width, height))
-        rounded_image.paste(image, (0, 0), rounded_mask)
-        return rounded_image
-
-    # Load the image
-    image_path = 'images/CancerDetective.png'
+BANNER_PATH = 'images/CancerDetective.png'
+BANNER_SIZE = (1200, 500)
+
+# Function to round the corners of the image
+def round_corners(image, radius=15):
+    width, height = image.size
+    rounded_mask = Image.new('L', (width, height), 0)
+    draw = ImageDraw.Draw(rounded_mask)
+    draw.rounded_rectangle((0, 0, width, height), radius=radius, fill=255)
+
+    # Create a new image with transparency and paste the original image onto it
+    rounded_image = Image.new('RGBA', (width, height))
+    rounded_image.paste(image, (0, 0), rounded_mask)
+    return rounded_image
+
+# Build the banner once per process: resize, round the corners and encode as WebP (which keeps
+# the transparent corners). `modified` is the source file's modification time, so the cached
+# banner is rebuilt only when the image changes.
+@st.cache_data(show_spinner=False)
+def load_banner(image_path, modified):
     image = Image.open(image_path)
+    rounded_image = round_corners(image.resize(BANNER_SIZE), radius=15)
+    buffered = io.BytesIO()
+    rounded_image.save(buffered, format="WEBP", quality=90)
+    return buffered.getvalue()
 
-    # Resize the image while keeping the height constant
-    new_width = 1200
-    new_height = 500
-    resized_image = image.resize((new_width, new_height))
-
-    # Round the corners of the image
-    rounded_image = round_corners(resized_image, radius=15)
-
-    # Display the resized and rounded image
-    st.image(rounded_image, use_column_width=True)
+def app():
+    # Display the resized and rounded image, straight from the cache
+    st.image(load_banner(BANNER_PATH, os.path.getmtime(BANNER_PATH)), use_column_width=True)
 
     st.markdown("""
                 <div class="main">
@@ -0,0 +1,293 @@
+import io
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
+from config import BATCH_SIZE, INFERENCE_TIMEOUT, INFERENCE_URL
+from backends import backend_model_id, get_backend
+from execution_profile import profile
+from instrumentation import metrics, span
+from model_registry import registry
+from prediction_cache import make_key, prediction_cache
+from preprocessing import to_batch
+from scheduler import SchedulerBusy, scheduler
+
+# Models are loaded lazily, through their backend, the first time a prediction (or warm_up()) needs them
+
+# Class labels of each model's probability vector, in output order, and whether each is cancerous
+CLASS_NAMES = {
+    'leukemia': ['Cancerous', 'Non-Cancerous'],
+    'lung': ['Lung Adenocarcinoma', 'Lung Benign Tissue', 'Lung Squamous Cell Carcinoma'],
+    'skin': ['Benign', 'Malignant'],
+}
+CANCEROUS = {
+    'leukemia': [True, False],
+    'lung': [True, False, True],
+    'skin': [False, True],
+}
+
+# Turn a model's raw output into one probability vector per image, ordered as in CLASS_NAMES
+def to_probabilities(name, prediction):
+    prediction = np.asarray(prediction, dtype=np.float32)
+    if name == 'leukemia':
+        # Single sigmoid output: add the non-cancerous complement as a second column
+        return np.concatenate([prediction, 1 - prediction], axis=1)
+    return prediction
+
+# Run one preprocessed batch through a model's backend and return its probability vectors
+# Every forward pass goes through the process-wide scheduler, which may raise SchedulerBusy, and
+# is counted in the registry as a use of the model by `holder` while it runs.
+def run_model(name, backend, batch, holder='inference'):
+    with scheduler.admit(name), registry.holding(name, holder):
+        start = time.perf_counter()
+        with span('predict', model=name, backend=backend.kind):
+            probabilities = to_probabilities(name, backend.predict(batch))
+    if name not in first_request_seconds:
+        first_request_seconds[name] = time.perf_counter() - start
+    return probabilities
+
+# Latency of each model's first forward pass in this process, and of its warm-up pass if it had one.
+# A first request that is much slower than later ones means the warm-up did not cover its setup.
+first_request_seconds = {}
+warmup_seconds = {}
+
+# Load each model and run it once on a dummy batch, so graph tracing and kernel setup happen
+# before the first real request. Warm-up passes are not counted as requests.
+def warm_up(names=CLASS_NAMES):
+    for name in names:
+        if name in warmup_seconds:
+            continue
+        backend = get_backend(name)
+        if backend is None:
+            continue
+        width, height = backend.input_size
+        start = time.perf_counter()
+        with span('warmup', model=name), registry.holding(name, 'warmup'):
+            backend.predict(np.zeros((1, height, width, 3), dtype=np.float32))
+        warmup_seconds[name] = time.perf_counter() - start
+        logging.info(f"{name} model warmed up in {warmup_seconds[name]:.2f}s")
+    return dict(warmup_seconds)
+
+# Startup costs under the current execution profile, to compare profiles
+def startup_report():
+    load_seconds = registry.load_report()
+    return {
+        'profile': profile(),
+        'models': {
+            name: {
+                'load_seconds': load_seconds.get(name),
+                'warmup_seconds': warmup_seconds.get(name),
+                'first_request_seconds': first_request_seconds.get(name),
+            }
+            for name in CLASS_NAMES
+        },
+    }
+
+# Gauges for the metrics export. Named apart from the `warmup_seconds` histogram that span('warmup')
+# already exports, since one metric family cannot be both a gauge and a histogram.
+def collect_metrics():
+    gauges = [('model_warmup_last_seconds', {'model': name}, seconds) for name, seconds in warmup_seconds.items()]
+    gauges += [('model_first_request_seconds', {'model': name}, seconds) for name, seconds in first_request_seconds.items()]
+    return gauges
+
+metrics.register_collector(collect_metrics)
+
+# Score any number of decoded images with one forward pass per `batch_size` images.
+# `images` may be a generator, so only one batch is held in memory at a time. If a `batches` list
+# is given, the preprocessed input batches are appended to it for reuse (Grad-CAM explains the
+# same tensor that was scored).
+# If CANCER_DETECTIVE_INFERENCE_URL is set, each batch is scored by the inference server instead.
+def predict_batch(name, images, batch_size=BATCH_SIZE, batches=None):
+    if INFERENCE_URL:
+        score = lambda chunk: remote_predict_batch(name, chunk)
+    else:
+        backend = get_backend(name)
+        if backend is None:
+            logging.error("%s model is not loaded.", name)
+            return None
+
+        def score(chunk):
+            batch = to_batch(chunk, size=backend.input_size)
+            logging.debug("Batch shape for %s prediction: %s", name, batch.shape)
+            if batches is not None:
+                batches.append(batch)
+            return run_model(name, backend, batch)
+
+    images = iter(images)
+    results = []
+    try:
+        while True:
+            chunk = list(islice(images, batch_size))
+            if not chunk:
+                break
+            results.append(score(chunk))
+    except SchedulerBusy:
+        raise
+    except Exception as e:
+        logging.error("Error during %s prediction: %s", name, e)
+        return None
+
+    if not results:
+        return np.empty((0, len(CLASS_NAMES[name])), dtype=np.float32)
+    return np.concatenate(results)
+
+# Cache key for an image's bytes under the currently served version of a model
+def cache_key(name, image_bytes):
+    model_id = backend_model_id(name)
+    if image_bytes is None or model_id is None:
+        return None
+    return make_key(model_id, image_bytes)
+
+# Ask the inference server (inference_server.py) to score one image; returns a probability vector
+def remote_predict(name, image_bytes, url=INFERENCE_URL):
+    request = urllib.request.Request(f"{url.rstrip('/')}/predict/{name}", data=image_bytes, method='POST',
+                                     headers={'Content-Type': 'application/octet-stream'})
+    try:
+        with span('remote_predict', model=name), urllib.request.urlopen(request, timeout=INFERENCE_TIMEOUT) as response:
+            result = json.load(response)
+    except urllib.error.HTTPError as e:
+        # The server's scheduler turned the request away
+        if e.code == 503:
+            raise SchedulerBusy(f"The {name} model is busy, please retry") from e
+        raise
+    return np.asarray(result['probabilities'], dtype=np.float32)
+
+# Lossless encoding of a decoded image, for sending it to the inference server
+def encode_png(image):
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+# Sends the images of a batch to the inference server side by side
+_remote_executor = ThreadPoolExecutor(max_workers=BATCH_SIZE, thread_name_prefix='remote-predict')
+
+# Score decoded images on the inference server. The server takes one image per request, so they
+# are all sent at once and its batcher merges them into one forward pass.
+def remote_predict_batch(name, images):
+    futures = [_remote_executor.submit(remote_predict, name, encode_png(image)) for image in images]
+    return np.stack([future.result() for future in futures])
+
+# Probability vector for one image, ordered as in CLASS_NAMES (None on failure, SchedulerBusy
+# if the model is too busy to take the request).
+# When the upload's bytes are given, repeated images are served from the prediction cache.
+# If CANCER_DETECTIVE_INFERENCE_URL is set, the model runs in the inference server instead of here.
+# `batches` collects the input batch built for a local prediction, as in predict_batch.
+def predict_probabilities(name, image, image_bytes=None, batches=None):
+    key = cache_key(name, image_bytes)
+    if key is not None:
+        cached = prediction_cache.get(key)
+        if cached is not None:
+            logging.debug("%s prediction served from cache", name)
+            return cached
+
+    if INFERENCE_URL:
+        if image_bytes is None:
+            image_bytes = encode_png(image)
+        try:
+            probabilities = remote_predict(name, image_bytes)
+        except SchedulerBusy:
+            raise
+        except Exception as e:
+            logging.error("Error during %s prediction on the inference server: %s", name, e)
+            return None
+    else:
+        probabilities = predict_batch(name, [image], batch_size=1, batches=batches)
+        if probabilities is None:
+            return None
+        probabilities = probabilities[0]
+    logging.debug("%s prediction: %s", name, probabilities)
+
+    if key is not None:
+        prediction_cache.put(key, probabilities)
+    return probabilities
+
+# Runs the three models side by side for "Scan with all models"
+_scan_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='scan-all')
+
+# Score one decoded image with every model. The input tensor is built once (per distinct input
+# size, normally just 224x224) and the forward passes run concurrently.
+# Returns {model name: probability vector or None}; raises SchedulerBusy if a model is too busy.
+def predict_all(image, image_bytes=None):
+    results = {}
+    keys = {name: cache_key(name, image_bytes) for name in CLASS_NAMES}
+    for name, key in keys.items():
+        cached = prediction_cache.get(key) if key is not None else None
+        if cached is not None:
+            results[name] = cached
+
+    pending = [name for name in CLASS_NAMES if name not in results]
+    futures = {}
+    if INFERENCE_URL and pending:
+        if image_bytes is None:
+            image_bytes = encode_png(image)
+        for name in pending:
+            futures[name] = _scan_executor.submit(remote_predict, name, image_bytes)
+    else:
+        tensors = {}
+        for name in pending:
+            backend = get_backend(name)
+            if backend is None:
+                logging.error("%s model is not loaded.", name)
+                results[name] = None
+                continue
+            if backend.input_size not in tensors:
+                tensors[backend.input_size] = to_batch([image], size=backend.input_size)
+            futures[name] = _scan_executor.submit(run_model, name, backend, tensors[backend.input_size])
+
+    for name, future in futures.items():
+        try:
+            probabilities = future.result()
+        except SchedulerBusy:
+            raise
+        except Exception as e:
+            logging.error("Error during %s prediction: %s", name, e)
+            results[name] = None
+            continue
+        if probabilities.ndim == 2:
+            probabilities = probabilities[0]
+        results[name] = probabilities
+        if keys[name] is not None:
+            prediction_cache.put(keys[name], probabilities)
+
+    return {name: results[name] for name in CLASS_NAMES}
+
+# Prediction function for skin cancer
+def predict_skin_image(image, image_bytes=None, batches=None):
+    probabilities = predict_probabilities('skin', image, image_bytes, batches)
+    if probabilities is None:
+        return None
+    return probabilities[np.newaxis, :]
+
+def predict_leukemia_image(image, image_bytes=None, batches=None):
+    probabilities = predict_probabilities('leukemia', image, image_bytes, batches)
+    if probabilities is None:
+        return None
+
+    cancerous_prob, non_cancerous_prob = (float(p) for p in probabilities)
+    return cancerous_prob, non_cancerous_prob
+
+# Define the class mapping with exact cancer types
+index = {
+    'lung_aca': 'Lung Adenocarcinoma (Cancerous)',
+    'lung_n': 'Lung Benign Tissue (Non-Cancerous)',
+    'lung_scc': 'Lung Squamous Cell Carcinoma (Cancerous)'
+}
+
+def predict_lung_image(image, image_bytes=None, batches=None):
+    probabilities = predict_probabilities('lung', image, image_bytes, batches)
+    if probabilities is None:
+        return None
+
+    # Probabilities of Lung Adenocarcinoma, Lung Benign Tissue and Lung Squamous Cell Carcinoma
+    lung_aca_prob, lung_n_prob, lung_scc_prob = probabilities
+
+    # Map the class with the highest probability to the corresponding cancer type
+    predicted_class_index = int(np.argmax(probabilities))
+    predicted_class = CLASS_NAMES['lung'][predicted_class_index]
+    cancer_status = 'Cancerous' if CANCEROUS['lung'][predicted_class_index] else 'Non-Cancerous'
+
+    return predicted_class, cancer_status, lung_aca_prob, lung_n_prob, lung_scc_prob
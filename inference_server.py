@@ -0,0 +1,202 @@
+import argparse
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from config import BATCH_WINDOW_MS, INFERENCE_TIMEOUT, MAX_BATCH_SIZE, MAX_IMAGE_BYTES, WARMUP
+from backends import get_backend
+from inference import CLASS_NAMES, run_model, startup_report, warm_up
+from instrumentation import metrics, start_exporters
+from preprocessing import decode_image, to_batch
+from scheduler import SchedulerBusy
+
+# Local inference service for the skin, leukemia and lung models.
+# Requests that arrive close together are merged into one batched forward pass.
+#
+#   python inference_server.py --port 8765
+#   CANCER_DETECTIVE_INFERENCE_URL=http://127.0.0.1:8765 streamlit run app.py
+#
+#   POST /predict/<model>   raw image bytes -> {"model", "classes", "probabilities"}
+#   GET  /metrics           queue depth and batch-size histogram per model
+#   GET  /metrics/prometheus  the same plus stage latencies, in the Prometheus text format
+#   GET  /health
+
+# Collects single-image requests for one model and runs them together.
+# The first request opens a window of `window` seconds; everything queued before it closes
+# (up to `max_batch` images) goes through the model in one call.
+class MicroBatcher:
+    def __init__(self, name, window, max_batch):
+        self.name = name
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.batch_sizes = Counter()
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._thread.start()
+
+    # Queue one preprocessed image (height x width x 3); the future resolves to its probability vector
+    def submit(self, tensor):
+        future = Future()
+        self.queue.put((tensor, future))
+        with self._lock:
+            self.requests += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return future
+
+    def _collect(self):
+        items = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            with self._lock:
+                self.batch_sizes[len(items)] += 1
+            try:
+                backend = get_backend(self.name)
+                if backend is None:
+                    raise RuntimeError(f"{self.name} model is not loaded")
+                probabilities = run_model(self.name, backend, np.stack([tensor for tensor, _ in items]), holder='inference_server')
+            except Exception as e:
+                logging.error("Error during %s batch of %d: %s", self.name, len(items), e)
+                with self._lock:
+                    self.errors += len(items)
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(items, probabilities):
+                future.set_result(vector)
+
+    # Read from the HTTP handler threads and the Prometheus collector while the batcher thread
+    # updates the counters, so both sides hold the lock
+    def metrics(self):
+        with self._lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'requests': self.requests,
+                'errors': self.errors,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            }
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    batchers = {}
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send_json(200, {name: batcher.metrics() for name, batcher in self.batchers.items()})
+        elif self.path == '/startup':
+            self._send_json(200, startup_report())
+        elif self.path == '/metrics/prometheus':
+            body = metrics.export().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        name = self.path.rsplit('/', 1)[-1]
+        if not self.path.startswith('/predict/') or name not in self.batchers:
+            self._send_json(404, {'error': f"Unknown model endpoint: {self.path}"})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        if MAX_IMAGE_BYTES and length > MAX_IMAGE_BYTES:
+            self._send_json(413, {'error': f"Image is {length} bytes, over the {MAX_IMAGE_BYTES} byte limit"})
+            return
+        image_bytes = self.rfile.read(length)
+        try:
+            # Decoding and resampling run on the request thread, so they overlap across clients
+            image = decode_image(io.BytesIO(image_bytes))
+            backend = get_backend(name)
+            if backend is None:
+                raise RuntimeError(f"{name} model is not loaded")
+            tensor = to_batch([image], size=backend.input_size)[0]
+        except Exception as e:
+            self._send_json(400, {'error': f"Could not prepare image: {e}"})
+            return
+
+        try:
+            probabilities = self.batchers[name].submit(tensor).result(timeout=INFERENCE_TIMEOUT)
+        except SchedulerBusy as e:
+            self._send_json(503, {'error': str(e)}, headers={'Retry-After': '1'})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+
+        self._send_json(200, {
+            'model': name,
+            'classes': CLASS_NAMES[name],
+            'probabilities': [float(p) for p in probabilities],
+        })
+
+    def log_message(self, format, *args):
+        logging.debug("%s - " + format, self.address_string(), *args)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Cancer Detective models over HTTP with micro-batching.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--window-ms', type=float, default=BATCH_WINDOW_MS, help="How long to wait for more requests to batch")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH_SIZE, help="Largest batch sent to a model")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    InferenceHandler.batchers = {
+        name: MicroBatcher(name, args.window_ms / 1000.0, args.max_batch) for name in CLASS_NAMES
+    }
+    metrics.register_collector(lambda: [
+        (gauge, {'model': name}, batcher.metrics()[gauge])
+        for name, batcher in InferenceHandler.batchers.items()
+        for gauge in ('queue_depth', 'max_queue_depth')
+    ])
+    start_exporters()
+    if WARMUP:
+        warm_up()
+    server = ThreadingHTTPServer((args.host, args.port), InferenceHandler)
+    logging.info(f"Inference server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_FILE, METRICS_INTERVAL, METRICS_PORT
+
+# Hot-path instrumentation: timing spans feed per-stage latency histograms, call counts and
+# error counts, exported in the Prometheus text format to a file and/or a local endpoint.
+#
+#   with span('predict', model='skin'):
+#       ...
+
+PREFIX = 'cancer_detective'
+
+# Upper bounds of the latency buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+def _label_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    # `collector()` returns [(metric name, {labels}, value)] gauges, read at export time
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def export(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        typed = set()
+        for (name, labels), histogram in histograms:
+            metric = f"{PREFIX}_{name}_seconds"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.bucket_counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_label_text(labels, ('le', bound))} {cumulative}")
+            lines.append(f"{metric}_bucket{_label_text(labels, ('le', '+Inf'))} {histogram.count}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {histogram.sum:.6f}")
+            lines.append(f"{metric}_count{_label_text(labels)} {histogram.count}")
+
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_label_text(labels)} {value}")
+
+        for collector in self.collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                logging.error("Error collecting metrics: %s", e)
+                continue
+            for name, labels, value in gauges:
+                metric = f"{PREFIX}_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} gauge")
+                    typed.add(metric)
+                lines.append(f"{metric}{_label_text(sorted(labels.items()))} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+# Time a block of work: records its duration in the `<stage>_seconds` histogram, counts it in
+# `<stage>_calls_total` and, if it raises, in `<stage>_errors_total` (the exception propagates)
+@contextmanager
+def span(stage, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.increment(f"{stage}_errors", **labels)
+        raise
+    finally:
+        metrics.observe(stage, time.perf_counter() - start, **labels)
+        metrics.increment(f"{stage}_calls", **labels)
+
+# Seconds spent importing each module loaded through timed_import, in import order
+import_seconds = {}
+
+# Import a module on first use and record how long that took (in `import_seconds` and the
+# `import_seconds` histogram). Later calls return the already imported module at no cost.
+def timed_import(module_name):
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    with span('import', module=module_name):
+        module = importlib.import_module(module_name)
+    import_seconds[module_name] = time.perf_counter() - start
+    logging.info(f"Imported {module_name} in {import_seconds[module_name]:.2f}s")
+    return module
+
+# Write the current metrics to a file, atomically so a scraper never reads half a file
+def write_metrics_file(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(metrics.export())
+    os.replace(tmp_path, path)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.export().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+# Start the configured exporters once per process: a local /metrics endpoint on
+# CANCER_DETECTIVE_METRICS_PORT and/or a file rewritten every METRICS_INTERVAL seconds
+def start_exporters(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_INTERVAL):
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    if port:
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        except OSError as e:
+            logging.error("Could not start the metrics endpoint on port %s: %s", port, e)
+        else:
+            threading.Thread(target=server.serve_forever, name='metrics-endpoint', daemon=True).start()
+            logging.info("Metrics available at http://127.0.0.1:%s/metrics", port)
+
+    if path:
+        def write_periodically():
+            while True:
+                try:
+                    write_metrics_file(path)
+                except OSError as e:
+                    logging.error("Could not write metrics to %s: %s", path, e)
+                time.sleep(interval)
+        threading.Thread(target=write_periodically, name='metrics-file', daemon=True).start()
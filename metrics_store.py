@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import threading
+import time
+from config import METRICS_RELOAD_INTERVAL
+
+# Evaluation results per model, one artifact each:
+#
+#   {"model": "skin", "class_names": [...], "test_accuracy": 0.814, "test_loss": 0.48,
+#    "confusion_matrix": [[...], ...], "history": {"accuracy": [...], "val_accuracy": [...], ...}}
+#
+# The training history is stored by column (one list per metric, indexed by epoch).
+METRICS_PATHS = {
+    'leukemia': 'json_files/leukemia/metrics.json',
+    'lung': 'json_files/lung cancer/metrics.json',
+    'skin': 'json_files/skin cancer/metrics.json',
+}
+
+# Parsed artifacts kept for the life of the process. A file is stat'ed at most once every
+# `check_interval` seconds and re-read only when its mtime changed, so a warm get() does no I/O.
+class MetricsStore:
+    def __init__(self, paths, check_interval=METRICS_RELOAD_INTERVAL):
+        self.paths = paths
+        self.check_interval = check_interval
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    # (metrics dict, version) for a model; the version changes whenever the file does.
+    # Raises OSError or ValueError if the artifact is missing or malformed.
+    def get(self, name):
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is not None and now - entry['checked'] < self.check_interval:
+                return entry['metrics'], entry['version']
+
+        path = self.paths[name]
+        version = os.path.getmtime(path)
+        if entry is None or entry['version'] != version:
+            with open(path, 'r') as file:
+                data = json.load(file)
+            logging.info(f"Loaded metrics for the {name} model from {path}")
+            entry = {'metrics': data, 'version': version}
+        entry['checked'] = now
+
+        with self._lock:
+            self.entries[name] = entry
+        return entry['metrics'], entry['version']
+
+    # Write an artifact atomically; readers pick it up on their next check
+    def save(self, name, data):
+        path = self.paths[name]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.entries.pop(name, None)
+
+metrics_store = MetricsStore(METRICS_PATHS)
@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+import numpy as np
+from execution_profile import apply_profile
+from tf_runtime import tf
+from instrumentation import metrics, span
+
+# Trained model files, keyed by the name used across the app
+MODEL_PATHS = {
+    'skin': 'models/skin_cancer_model.h5',
+    'leukemia': 'models/leukemia_cancer_model.h5',
+    'lung': 'models/lung_cancer_model.h5',
+}
+
+# Approximate memory held by a model's weights, in bytes
+def model_memory_bytes(model):
+    total = 0
+    for weight in model.weights:
+        dtype = getattr(weight.dtype, 'as_numpy_dtype', weight.dtype)
+        total += int(np.prod(weight.shape)) * np.dtype(dtype).itemsize
+    return total
+
+# Process-wide model cache: each model is deserialized once, the first time it is requested,
+# and every page shares that single copy
+class ModelRegistry:
+    def __init__(self, paths):
+        self.paths = dict(paths)
+        self.models = {}
+        self.load_times = {}
+        self.memory = {}
+        self.errors = {}
+        self.versions = {}
+        self.holders = {name: Counter() for name in self.paths}
+        self._holders_lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in self.paths}
+
+    # Return the model for the given name, loading it on first use (None if loading failed)
+    def get(self, name):
+        if name in self.models:
+            return self.models[name]
+
+        # One lock per model, so a slow load of one model doesn't block the others
+        with self._locks[name]:
+            # Another thread may have finished loading while we were waiting
+            if name in self.models:
+                return self.models[name]
+
+            apply_profile()
+            start = time.perf_counter()
+            try:
+                with span('model_load', model=name):
+                    model = tf.keras.models.load_model(self.paths[name])
+                self.memory[name] = model_memory_bytes(model)
+                logging.info(f"{name} model loaded in {time.perf_counter() - start:.2f}s "
+                             f"({self.memory[name] / 1e6:.1f} MB)")
+            except Exception as e:
+                logging.error(f"Error loading {name} model: {e}")
+                self.errors[name] = str(e)
+                model = None
+            self.load_times[name] = time.perf_counter() - start
+            self.models[name] = model
+            return model
+
+    # Serve an already built model under a name, e.g. a stand-in model for benchmarks
+    def register(self, name, model):
+        apply_profile()
+        with self._locks[name]:
+            self.models[name] = model
+            self.memory[name] = model_memory_bytes(model)
+            self.load_times[name] = 0.0
+            self.versions[name] = f"{name}-registered-{id(model)}"
+
+    # Identity of a model file on disk (name, size and modification time), or None if it is missing.
+    # Computed once, like the model itself, so it always describes the copy this process serves.
+    def model_id(self, name):
+        if name not in self.versions:
+            try:
+                stat = os.stat(self.paths[name])
+                self.versions[name] = f"{name}-{stat.st_size}-{stat.st_mtime_ns}"
+            except OSError:
+                return None
+        return self.versions[name]
+
+    # Record that `holder` (the component running it, e.g. 'tiling') is using the model until the
+    # matching release(). The model stays cached after the last release, for the next user.
+    def hold(self, name, holder):
+        with self._holders_lock:
+            self.holders[name][holder] += 1
+
+    def release(self, name, holder):
+        with self._holders_lock:
+            self.holders[name][holder] -= 1
+            if self.holders[name][holder] <= 0:
+                del self.holders[name][holder]
+
+    # Hold the model for the duration of the block
+    @contextmanager
+    def holding(self, name, holder):
+        self.hold(name, holder)
+        try:
+            yield
+        finally:
+            self.release(name, holder)
+
+    def is_loaded(self, name):
+        return self.models.get(name) is not None
+
+    # Per-model status for display: load state, load time, memory and the number of uses (forward
+    # passes, warm-ups, explanations) running right now. Never triggers a load.
+    def stats(self):
+        with self._holders_lock:
+            holders = {name: sum(counts.values()) for name, counts in self.holders.items()}
+        return {
+            name: {
+                'loaded': self.is_loaded(name),
+                'load_seconds': self.load_times.get(name),
+                'memory_bytes': self.memory.get(name, 0),
+                'holders': holders[name],
+            }
+            for name in self.paths
+        }
+
+    # Cold-start cost of every model loaded so far, in seconds
+    def load_report(self):
+        return dict(self.load_times)
+
+    # Gauges for the metrics export
+    def collect_metrics(self):
+        gauges = []
+        for name, stats in self.stats().items():
+            gauges.append(('model_loaded', {'model': name}, int(stats['loaded'])))
+            gauges.append(('model_memory_bytes', {'model': name}, stats['memory_bytes']))
+            gauges.append(('model_holders', {'model': name}, stats['holders']))
+        return gauges
+
+registry = ModelRegistry(MODEL_PATHS)
+metrics.register_collector(registry.collect_metrics)
@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from backends import get_backend
+from config import BATCH_SIZE, DECODE_WORKERS, PREFETCH
+from inference import run_model
+from preprocessing import decode_image, to_batch
+
+# Staged bulk scoring: a pool of decode/resize workers fills a bounded prefetch queue, which
+# feeds the batched model stage. Decoding the next images overlaps with the current forward pass.
+#
+#   paths -> [decode + resample x decode_workers] -> prefetch queue -> [batch + predict] -> results
+
+class Pipeline:
+    def __init__(self, models, batch_size=BATCH_SIZE, decode_workers=DECODE_WORKERS, prefetch=PREFETCH):
+        self.backends = {}
+        for name in models:
+            backend = get_backend(name)
+            if backend is None:
+                raise RuntimeError(f"Could not load the {name} model")
+            self.backends[name] = backend
+        # Each image is resampled once per distinct model input size
+        self.sizes = {backend.input_size for backend in self.backends.values()}
+        self.batch_size = batch_size
+        self.decode_workers = decode_workers
+        self.prefetch = prefetch
+
+        self.images = 0
+        self.batches = 0
+        self.decode_busy = 0.0
+        self.inference_busy = 0.0
+        self.inference_starved = 0.0
+        self.decode_blocked = 0.0
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+
+    # Decode stage, run on the worker pool: returns (path, {input size: tensor}, error)
+    def _decode(self, path):
+        start = time.perf_counter()
+        try:
+            image = decode_image(path)
+            result = (path, {size: to_batch([image], size=size)[0] for size in self.sizes}, None)
+        except Exception as e:
+            result = (path, None, str(e))
+        with self._lock:
+            self.decode_busy += time.perf_counter() - start
+        return result
+
+    # Queue put that gives up once the consumer has stopped
+    def _put(self, prefetch_queue, item, stop):
+        while not stop.is_set():
+            try:
+                prefetch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # Submits decode tasks in input order; the bounded queue limits how many are in flight
+    def _produce(self, paths, executor, prefetch_queue, stop):
+        try:
+            for path in paths:
+                if stop.is_set():
+                    return
+                future = executor.submit(self._decode, path)
+                start = time.perf_counter()
+                if not self._put(prefetch_queue, future, stop):
+                    return
+                self.decode_blocked += time.perf_counter() - start
+        except Exception as e:
+            # Hand the error to the consumer (unless it stopped early and shut the executor down)
+            if not stop.is_set():
+                self._put(prefetch_queue, e, stop)
+            return
+        self._put(prefetch_queue, None, stop)
+
+    # Stream results for `paths` (any iterable, consumed lazily), one batch at a time:
+    # (paths scored, {model name: probabilities}, [(path, error) for images that failed to decode])
+    def run(self, paths):
+        start = time.perf_counter()
+        prefetch_queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix='decode')
+        producer = threading.Thread(target=self._produce, args=(iter(paths), executor, prefetch_queue, stop),
+                                    name='pipeline-producer', daemon=True)
+        producer.start()
+
+        try:
+            finished = False
+            while not finished:
+                items = []
+                wait_start = time.perf_counter()
+                while len(items) < self.batch_size:
+                    future = prefetch_queue.get()
+                    if future is None:
+                        finished = True
+                        break
+                    if isinstance(future, Exception):
+                        raise future
+                    items.append(future.result())
+                self.inference_starved += time.perf_counter() - wait_start
+
+                decoded = [(path, tensors) for path, tensors, error in items if error is None]
+                failures = [(path, error) for path, tensors, error in items if error is not None]
+                predictions = {}
+                if decoded:
+                    busy_start = time.perf_counter()
+                    for name, backend in self.backends.items():
+                        batch = np.stack([tensors[backend.input_size] for _, tensors in decoded])
+                        predictions[name] = run_model(name, backend, batch, holder='pipeline')
+                    self.inference_busy += time.perf_counter() - busy_start
+                    self.batches += 1
+                self.images += len(items)
+
+                if items:
+                    yield [path for path, _ in decoded], predictions, failures
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            producer.join()
+            self.wall_seconds += time.perf_counter() - start
+
+    # Share of the wall time each stage spent working. The stage that waits on the other
+    # the least is the bottleneck.
+    def report(self):
+        wall = self.wall_seconds or 1e-9
+        return {
+            'images': self.images,
+            'batches': self.batches,
+            'wall_seconds': round(self.wall_seconds, 3),
+            'images_per_second': round(self.images / wall, 2),
+            'decode_workers': self.decode_workers,
+            'prefetch': self.prefetch,
+            'decode_utilization': round(self.decode_busy / (wall * self.decode_workers), 3),
+            'inference_utilization': round(self.inference_busy / wall, 3),
+            'inference_starved_seconds': round(self.inference_starved, 3),
+            'decode_blocked_seconds': round(self.decode_blocked, 3),
+            'bottleneck': 'decode' if self.inference_starved > self.decode_blocked else 'inference',
+        }
+
+    def log_report(self):
+        report = self.report()
+        logging.info(f"Pipeline: {report['images']} images in {report['wall_seconds']}s "
+                     f"({report['images_per_second']}/s), decode {report['decode_utilization']:.0%} busy, "
+                     f"inference {report['inference_utilization']:.0%} busy, bottleneck: {report['bottleneck']}")
+        return report
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import PREDICTION_CACHE_DIR, PREDICTION_CACHE_SIZE
+from instrumentation import metrics
+
+# Content hash of an uploaded image's bytes
+def image_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+# Cache key: the same image scored by the same model version always maps to the same entry
+def make_key(model_id, data):
+    return f"{model_id}-{image_hash(data)}"
+
+# Probability vectors keyed by image content and model version.
+# A bounded in-memory LRU sits in front of an optional on-disk tier of .npy files.
+class PredictionCache:
+    def __init__(self, max_entries, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+        if self.directory:
+            try:
+                probabilities = np.load(self._disk_path(key))
+            except (OSError, ValueError):
+                probabilities = None
+            if probabilities is not None:
+                self._remember(key, probabilities)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return probabilities
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, probabilities):
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        self._remember(key, probabilities)
+
+        if self.directory:
+            # Write to a temporary file first so a crash never leaves a truncated entry behind
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as file:
+                    np.save(file, probabilities)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.error("Error writing prediction cache entry %s: %s", path, e)
+
+    def _remember(self, key, probabilities):
+        with self._lock:
+            self.entries[key] = probabilities
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    # Gauges for the metrics export
+    def collect_metrics(self):
+        return [(f"prediction_cache_{key}", {}, value) for key, value in self.stats().items()]
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_DIR)
+metrics.register_collector(prediction_cache.collect_metrics)
@@ -0,0 +1,83 @@
+import os
+import numpy as np
+from PIL import Image
+from config import DECODE_MIN_SIZE, MAX_IMAGE_BYTES, MAX_IMAGE_PIXELS
+from instrumentation import span
+
+# Input size shared by the skin, leukemia and lung models
+MODEL_INPUT_SIZE = (224, 224)
+
+# (width, height) a Keras model expects, falling back to the shared default
+def model_input_size(model):
+    shape = getattr(model, 'input_shape', None)
+    if shape is not None and len(shape) == 4 and shape[1] and shape[2]:
+        return (shape[2], shape[1])
+    return MODEL_INPUT_SIZE
+
+# Raised for images over the configured byte or pixel budget, before their pixels are decoded
+class ImageTooLarge(ValueError):
+    pass
+
+# Encoded size of an upload (Streamlit UploadedFile or other file-like object) or a path
+def source_bytes(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    if getattr(source, 'size', None) is not None:
+        return source.size
+    try:
+        position = source.tell()
+        size = source.seek(0, os.SEEK_END)
+        source.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+# Decode an upload (file-like object or path) no larger than it needs to be: JPEGs are scaled
+# down by 1/2, 1/4 or 1/8 while decoding, and other formats reduced by an integer factor right
+# after, keeping the shorter side at least `min_size` (enough for the model input and the
+# 500x500 preview). Files over `max_bytes`, or that would still decode to more than
+# `max_pixels`, raise ImageTooLarge before any pixels are allocated.
+def decode_image(source, min_size=DECODE_MIN_SIZE, max_pixels=MAX_IMAGE_PIXELS, max_bytes=MAX_IMAGE_BYTES):
+    with span('decode'):
+        size_bytes = source_bytes(source) if max_bytes else None
+        if size_bytes is not None and size_bytes > max_bytes:
+            raise ImageTooLarge(f"The file is {size_bytes / 1e6:.1f} MB, over the {max_bytes / 1e6:.0f} MB limit")
+
+        try:
+            image = Image.open(source)
+        except Image.DecompressionBombError as e:
+            raise ImageTooLarge(str(e)) from e
+
+        if min_size and image.format == 'JPEG':
+            image.draft('RGB', (min_size, min_size))
+
+        width, height = image.size
+        if max_pixels and width * height > max_pixels:
+            raise ImageTooLarge(f"The image is {width}x{height} pixels, over the "
+                                f"{max_pixels / 1e6:.0f} megapixel limit")
+
+        image = image.convert('RGB')
+        if min_size:
+            factor = min(image.size) // min_size
+            if factor >= 2:
+                image = image.reduce(factor)
+        return image
+
+# Resample each image once to the model input size (the whole frame, squashed like the original
+# 500x500 resize did, never cropped) and stack them into one contiguous batch.
+# float32 batches are scaled to [0, 1]; uint8 batches keep raw pixel values.
+def to_batch(images, size=MODEL_INPUT_SIZE, dtype=np.float32):
+    width, height = size
+    batch = np.empty((len(images), height, width, 3), dtype=dtype)
+
+    with span('preprocess', step='resample'):
+        for i, image in enumerate(images):
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            batch[i] = np.asarray(image.resize(size, Image.Resampling.LANCZOS))
+
+    if batch.dtype != np.uint8:
+        with span('preprocess', step='normalize'):
+            batch /= 255.0
+
+    return batch
@@ -0,0 +1,45 @@
+import base64
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import PREVIEW_CACHE_SIZE, PREVIEW_QUALITY
+from instrumentation import metrics, span
+
+# Upload previews: a JPEG at display size, encoded once per upload and reused on every rerun.
+# The lossless 500x500 PNG sent before was several times larger for the same on-screen result.
+
+PREVIEW_SIZE = (500, 500)
+
+_previews = OrderedDict()
+_lock = threading.Lock()
+
+def encode_preview(image, quality=PREVIEW_QUALITY):
+    buffered = io.BytesIO()
+    image.resize(PREVIEW_SIZE).save(buffered, format="JPEG", quality=quality)
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+# Base64 JPEG preview of an image. `key` identifies the upload (e.g. a hash of its bytes);
+# previews with a key are cached, so repeated renders skip the resize and encode. The bytes sent
+# are counted where the preview is rendered, since every rerun sends it again.
+def make_preview(image, key=None):
+    if key is not None:
+        with _lock:
+            if key in _previews:
+                _previews.move_to_end(key)
+                img_base64 = _previews[key]
+                metrics.increment('preview_cache_hits')
+                return img_base64
+
+    start = time.perf_counter()
+    with span('preview_encode'):
+        img_base64 = encode_preview(image)
+    logging.debug("Preview encoded in %.1f ms (%d bytes)", (time.perf_counter() - start) * 1000, len(img_base64))
+
+    if key is not None:
+        with _lock:
+            _previews[key] = img_base64
+            while len(_previews) > PREVIEW_CACHE_SIZE:
+                _previews.popitem(last=False)
+    return img_base64
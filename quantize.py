@@ -0,0 +1,159 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from itertools import islice
+import numpy as np
+from tf_runtime import tf
+from backends import KerasBackend, TFLiteBackend, tflite_path
+from config import BATCH_SIZE
+from datasets import iter_images, iter_labeled_images
+from inference import CLASS_NAMES, run_model
+from model_registry import MODEL_PATHS, registry
+from preprocessing import decode_image, to_batch
+
+# Post-training quantization with an accuracy gate.
+#
+#   python quantize.py skin --mode int8 --calibration data/skin/train --eval data/skin/test --max-drop 0.01
+#
+# The quantized model is compared with the original on a labeled set (one sub-directory per
+# class) and only replaces models/<model>.tflite, the file the TFLite backend serves, when its
+# accuracy drop stays within the threshold.
+
+# Calibration samples for int8 quantization, one preprocessed image at a time
+def representative_dataset(directory, size, samples):
+    def generate():
+        for path in islice(iter_images(directory), samples):
+            yield [to_batch([decode_image(path)], size=size)]
+    return generate
+
+def quantize(model, mode, calibration_dir=None, samples=200):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        if not calibration_dir:
+            raise ValueError("int8 quantization needs a calibration directory")
+        size = KerasBackend(model).input_size
+        converter.representative_dataset = representative_dataset(calibration_dir, size, samples)
+    return converter.convert()
+
+# Run both backends over the labeled set, one batch at a time, keeping only counters
+def compare(name, reference, candidate, eval_dir, batch_size=BATCH_SIZE):
+    num_classes = len(CLASS_NAMES[name])
+    correct = {'original': 0, 'quantized': 0}
+    agree = np.zeros(num_classes, dtype=np.int64)
+    per_class = np.zeros(num_classes, dtype=np.int64)
+    latency = {'original': 0.0, 'quantized': 0.0}
+    total = 0
+
+    samples = iter_labeled_images(eval_dir, name)
+    while True:
+        chunk = list(islice(samples, batch_size))
+        if not chunk:
+            break
+        labels = np.array([label for _, label in chunk])
+        batch = to_batch([decode_image(path) for path, _ in chunk], size=reference.input_size)
+
+        predictions = {}
+        for variant, backend in (('original', reference), ('quantized', candidate)):
+            start = time.perf_counter()
+            predictions[variant] = run_model(name, backend, batch).argmax(axis=1)
+            latency[variant] += time.perf_counter() - start
+            correct[variant] += int((predictions[variant] == labels).sum())
+
+        np.add.at(per_class, labels, 1)
+        np.add.at(agree, labels, (predictions['original'] == predictions['quantized']).astype(np.int64))
+        total += len(chunk)
+
+    if total == 0:
+        raise ValueError(f"No labeled images for the {name} model in {eval_dir}")
+
+    accuracy = {variant: correct[variant] / total for variant in correct}
+    return {
+        'images': total,
+        'accuracy': accuracy,
+        'accuracy_drop': accuracy['original'] - accuracy['quantized'],
+        'agreement': float(agree.sum() / total),
+        'per_class_agreement': {
+            class_name: float(agree[i] / per_class[i]) if per_class[i] else None
+            for i, class_name in enumerate(CLASS_NAMES[name])
+        },
+        'latency_ms_per_image': {variant: 1000 * seconds / total for variant, seconds in latency.items()},
+    }
+
+def run(name, mode, calibration_dir, eval_dir, max_drop, samples, publish=True, batch_size=BATCH_SIZE):
+    model = registry.get(name)
+    if model is None:
+        raise RuntimeError(f"Could not load the {name} model")
+
+    start = time.perf_counter()
+    flatbuffer = quantize(model, mode, calibration_dir, samples)
+    conversion_seconds = time.perf_counter() - start
+
+    # Write next to the published file so the final replace is atomic
+    target = tflite_path(name)
+    fd, candidate_path = tempfile.mkstemp(suffix='.tflite', dir=os.path.dirname(target))
+    with os.fdopen(fd, 'wb') as file:
+        file.write(flatbuffer)
+
+    try:
+        start = time.perf_counter()
+        candidate = TFLiteBackend(candidate_path)
+        quantized_load_seconds = time.perf_counter() - start
+
+        report = {
+            'model': name,
+            'mode': mode,
+            'conversion_seconds': conversion_seconds,
+            'size_bytes': {'original': os.path.getsize(MODEL_PATHS[name]), 'quantized': len(flatbuffer)},
+            'load_seconds': {'original': registry.load_report().get(name), 'quantized': quantized_load_seconds},
+            'max_accuracy_drop': max_drop,
+        }
+        report.update(compare(name, KerasBackend(model), candidate, eval_dir, batch_size))
+        report['passed'] = report['accuracy_drop'] <= max_drop
+
+        if report['passed'] and publish:
+            os.replace(candidate_path, target)
+            report['published'] = target
+        else:
+            report['published'] = None
+    finally:
+        if os.path.exists(candidate_path):
+            os.remove(candidate_path)
+
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize a model and publish it only if its accuracy holds up.")
+    parser.add_argument('model', choices=sorted(MODEL_PATHS))
+    parser.add_argument('--mode', choices=['int8', 'float16'], default='int8')
+    parser.add_argument('--calibration', help="Directory of representative images (required for int8)")
+    parser.add_argument('--samples', type=int, default=200, help="Calibration images to use")
+    parser.add_argument('--eval', required=True, help="Labeled directory with one sub-directory per class")
+    parser.add_argument('--max-drop', type=float, default=0.01, help="Largest accepted accuracy drop (0.01 = 1 point)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="Report only, never publish")
+    parser.add_argument('--report', help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    report = run(args.model, args.mode, args.calibration, args.eval, args.max_drop, args.samples,
+                 publish=not args.dry_run, batch_size=args.batch_size)
+
+    print(json.dumps(report, indent=4))
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=4)
+
+    if not report['passed']:
+        logging.error(f"Accuracy drop {report['accuracy_drop']:.4f} exceeds {args.max_drop}; not published")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import threading
+import time
+from contextlib import contextmanager
+from config import INFERENCE_CONCURRENCY, INFERENCE_QUEUE_SIZE, INFERENCE_QUEUE_TIMEOUT
+from instrumentation import metrics
+
+# Admission control for model inference, shared by every session in the process. At most
+# `concurrency` forward passes run per model; up to `queue_size` more callers wait for a slot, for
+# at most `timeout` seconds. Beyond that a caller is turned away at once with SchedulerBusy, rather
+# than piling onto a CPU that is already saturated and slowing everyone down.
+#
+#   with scheduler.admit('skin'):
+#       backend.predict(batch)
+
+class SchedulerBusy(RuntimeError):
+    pass
+
+class InferenceScheduler:
+    def __init__(self, concurrency=INFERENCE_CONCURRENCY, queue_size=INFERENCE_QUEUE_SIZE, timeout=INFERENCE_QUEUE_TIMEOUT):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.slots = {}
+        self.waiting = {}
+        self.running = {}
+        self._lock = threading.Lock()
+
+    def _slots(self, name):
+        with self._lock:
+            if name not in self.slots:
+                self.slots[name] = threading.BoundedSemaphore(self.concurrency)
+                self.waiting[name] = 0
+                self.running[name] = 0
+            return self.slots[name]
+
+    # Hold one of the model's slots for the duration of the block. Time spent waiting for it is
+    # recorded in `queue_wait_seconds`, apart from the forward pass itself (`predict_seconds`).
+    @contextmanager
+    def admit(self, name):
+        slots = self._slots(name)
+        start = time.perf_counter()
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting[name] >= self.queue_size:
+                    metrics.increment('inference_rejected', model=name, reason='queue_full')
+                    raise SchedulerBusy(f"The {name} model is busy, please retry")
+                self.waiting[name] += 1
+            try:
+                acquired = slots.acquire(timeout=self.timeout)
+            finally:
+                with self._lock:
+                    self.waiting[name] -= 1
+            if not acquired:
+                metrics.increment('inference_rejected', model=name, reason='timeout')
+                raise SchedulerBusy(f"The {name} model is busy, please retry")
+        metrics.observe('queue_wait', time.perf_counter() - start, model=name)
+
+        with self._lock:
+            self.running[name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.running[name] -= 1
+            slots.release()
+
+    # Gauges for the metrics export
+    def collect_metrics(self):
+        with self._lock:
+            gauges = [('inference_waiting', {'model': name}, count) for name, count in self.waiting.items()]
+            gauges += [('inference_running', {'model': name}, count) for name, count in self.running.items()]
+        return gauges
+
+scheduler = InferenceScheduler()
+metrics.register_collector(scheduler.collect_metrics)
@@ -0,0 +1,7 @@
+import execution_profile  # noqa: F401
+import tensorflow as tf
+
+# TensorFlow, imported after the execution profile: TensorFlow reads the profile's oneDNN setting
+# when it is imported, so modules take `tf` from here instead of importing it themselves.
+#
+#   from tf_runtime import tf
@@ -0,0 +1,208 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from itertools import islice
+import numpy as np
+from PIL import Image
+from backends import get_backend
+from config import BATCH_SIZE, MAX_IMAGE_BYTES, MAX_IMAGE_PIXELS, TILE_OVERLAP, TILE_SIZE, TISSUE_THRESHOLD
+from inference import CANCEROUS, CLASS_NAMES, run_model
+from instrumentation import span
+from preprocessing import ImageTooLarge, source_bytes, to_batch
+
+try:
+    import openslide
+except ImportError:
+    openslide = None
+
+# Tiled inference for large histopathology images. Instead of squashing the whole capture to the
+# model input size, the image is read region by region and cut into overlapping tiles at native
+# resolution. Background tiles are skipped, the rest go through the lung model in batches, and
+# the tile scores are combined into a slide-level class and a coarse heatmap.
+#
+#   python tiling.py slide.svs --heatmap slide_heatmap.png
+
+# Whole-slide formats read through OpenSlide when it is installed
+SLIDE_EXTENSIONS = ('.svs', '.ndpi', '.mrxs', '.scn', '.vms', '.vmu', '.tif', '.tiff', '.bif')
+
+# Highest resolution level of a whole-slide image; regions are read on demand, so memory is
+# bounded by the tiles in flight rather than the slide size
+class OpenSlideReader:
+    def __init__(self, path):
+        self.slide = openslide.OpenSlide(path)
+        self.dimensions = self.slide.dimensions
+
+    def read_region(self, x, y, width, height):
+        return self.slide.read_region((x, y), 0, (width, height)).convert('RGB')
+
+    def close(self):
+        self.slide.close()
+
+# Any image Pillow can open. Pillow has no region decoding for these formats, so the image is
+# decoded once and tiles are cropped from it. Unlike decode_image it never downscales, since tiles
+# need the full resolution, but the same byte and pixel budgets apply before anything is decoded.
+class PILReader:
+    def __init__(self, source, max_pixels=MAX_IMAGE_PIXELS, max_bytes=MAX_IMAGE_BYTES):
+        size_bytes = source_bytes(source) if max_bytes else None
+        if size_bytes is not None and size_bytes > max_bytes:
+            raise ImageTooLarge(f"The file is {size_bytes / 1e6:.1f} MB, over the {max_bytes / 1e6:.0f} MB limit")
+
+        try:
+            image = Image.open(source)
+        except Image.DecompressionBombError as e:
+            raise ImageTooLarge(str(e)) from e
+
+        width, height = image.size
+        if max_pixels and width * height > max_pixels:
+            image.close()
+            raise ImageTooLarge(f"The image is {width}x{height} pixels, over the "
+                                f"{max_pixels / 1e6:.0f} megapixel limit")
+
+        self.image = image.convert('RGB')
+        self.dimensions = self.image.size
+
+    def read_region(self, x, y, width, height):
+        return self.image.crop((x, y, x + width, y + height))
+
+    def close(self):
+        self.image.close()
+
+# OpenSlide for whole-slide files when available, Pillow for everything else (including uploads)
+def open_image(source):
+    if openslide is not None and isinstance(source, str) and source.lower().endswith(SLIDE_EXTENSIONS):
+        try:
+            return OpenSlideReader(source)
+        except openslide.OpenSlideError as e:
+            logging.info(f"OpenSlide could not open {source}, falling back to Pillow: {e}")
+    return PILReader(source)
+
+# Start offsets along one axis: `tile`-sized windows `stride` apart, the last one flush with the edge
+def tile_offsets(length, tile, stride):
+    if length <= tile:
+        return [0]
+    offsets = list(range(0, length - tile + 1, stride))
+    if offsets[-1] != length - tile:
+        offsets.append(length - tile)
+    return offsets
+
+# Share of a tile covered by tissue. Slide background is bright and unsaturated, stained tissue
+# is not, so this only looks at the saturation of a 32x32 thumbnail.
+def tissue_fraction(tile):
+    saturation = np.asarray(tile.resize((32, 32), Image.Resampling.NEAREST).convert('HSV'))[..., 1]
+    return float((saturation > 20).mean())
+
+# Score an image tile by tile. Returns the slide-level result, or None if the model is unavailable:
+#   probabilities  mean class probabilities over the tissue tiles
+#   heatmap        (rows x cols x classes) tile probabilities, NaN for background tiles
+def predict_tiled(source, name='lung', tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                  tissue_threshold=TISSUE_THRESHOLD, batch_size=BATCH_SIZE):
+    backend = get_backend(name)
+    if backend is None:
+        logging.error("%s model is not loaded.", name)
+        return None
+
+    num_classes = len(CLASS_NAMES[name])
+    reader = open_image(source)
+    try:
+        width, height = reader.dimensions
+        stride = max(1, int(tile_size * (1 - overlap)))
+        xs = tile_offsets(width, tile_size, stride)
+        ys = tile_offsets(height, tile_size, stride)
+        heatmap = np.full((len(ys), len(xs), num_classes), np.nan, dtype=np.float32)
+
+        # Tissue tiles, read lazily so only one batch of them is in memory at a time
+        def tissue_tiles():
+            for row, y in enumerate(ys):
+                for col, x in enumerate(xs):
+                    tile = reader.read_region(x, y, min(tile_size, width - x), min(tile_size, height - y))
+                    if tissue_fraction(tile) >= tissue_threshold:
+                        yield row, col, tile
+
+        tiles = tissue_tiles()
+        scored = 0
+        with span('predict_tiled', model=name):
+            while True:
+                chunk = list(islice(tiles, batch_size))
+                if not chunk:
+                    break
+                batch = to_batch([tile for _, _, tile in chunk], size=backend.input_size)
+                probabilities = run_model(name, backend, batch, holder='tiling')
+                for (row, col, _), p in zip(chunk, probabilities):
+                    heatmap[row, col] = p
+                scored += len(chunk)
+    finally:
+        reader.close()
+
+    total = len(xs) * len(ys)
+    if scored == 0:
+        return {'dimensions': (width, height), 'tiles': 0, 'background_tiles': total,
+                'probabilities': None, 'predicted_class': None, 'status': None, 'heatmap': heatmap}
+
+    probabilities = np.nanmean(heatmap.reshape(-1, num_classes), axis=0)
+    predicted = int(np.argmax(probabilities))
+    return {
+        'dimensions': (width, height),
+        'tiles': scored,
+        'background_tiles': total - scored,
+        'probabilities': probabilities,
+        'predicted_class': CLASS_NAMES[name][predicted],
+        'status': 'Cancerous' if CANCEROUS[name][predicted] else 'Non-Cancerous',
+        'heatmap': heatmap,
+    }
+
+# Probability that each tile is cancerous (sum over the cancerous classes), NaN for background
+def cancer_heatmap(result, name='lung'):
+    return result['heatmap'][..., np.array(CANCEROUS[name])].sum(axis=2)
+
+# Heatmap as an image `width` pixels wide: white (benign) to red (cancerous), grey for background
+def heatmap_image(result, name='lung', width=500):
+    scores = cancer_heatmap(result, name)
+    background = np.isnan(scores)
+    scores = np.nan_to_num(scores)
+    pixels = np.empty(scores.shape + (3,), dtype=np.uint8)
+    pixels[..., 0] = 255 - scores * (255 - 0xeb)
+    pixels[..., 1] = 255 - scores * (255 - 0x19)
+    pixels[..., 2] = 255 - scores * (255 - 0x48)
+    pixels[background] = (200, 200, 200)
+
+    rows, cols = scores.shape
+    image = Image.fromarray(pixels, 'RGB')
+    return image.resize((width, max(1, round(width * rows / cols))), Image.Resampling.NEAREST)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a large histopathology image tile by tile.")
+    parser.add_argument('image', help="Whole-slide file (read with OpenSlide if installed) or any Pillow image")
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE)
+    parser.add_argument('--overlap', type=float, default=TILE_OVERLAP, help="Fraction of a tile shared with its neighbour")
+    parser.add_argument('--tissue-threshold', type=float, default=TISSUE_THRESHOLD,
+                        help="Smallest tissue fraction for a tile to be scored")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--heatmap', help="Write the heatmap to this image file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not os.path.exists(args.image):
+        parser.error(f"{args.image} does not exist")
+
+    try:
+        result = predict_tiled(args.image, tile_size=args.tile_size, overlap=args.overlap,
+                               tissue_threshold=args.tissue_threshold, batch_size=args.batch_size)
+    except ImageTooLarge as e:
+        logging.error(f"{args.image} is too large to tile: {e}")
+        return 1
+    if result is None:
+        return 1
+
+    summary = {key: value for key, value in result.items() if key != 'heatmap'}
+    if result['probabilities'] is not None:
+        summary['probabilities'] = dict(zip(CLASS_NAMES['lung'], result['probabilities'].tolist()))
+    print(json.dumps(summary, indent=4))
+
+    if args.heatmap and result['tiles']:
+        heatmap_image(result).save(args.heatmap)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
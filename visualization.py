@@ -1,65 +1,75 @@
+import sys
 import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
-import numpy as np
 import pandas as pd
-from tensorflow.keras.models import load_model  # type: ignore
-import json
-
-def load_training_history(file_path):
-    try:
-        with open(file_path, 'r') as file:
-            history = json.load(file)
-        return history
-    except FileNotFoundError:
-        st.error(f"File not found: {file_path}")
-        return None
-    except json.JSONDecodeError as e:
-        st.error(f"Error decoding JSON: {e}")
-        return None
-
-def load_test_accuracy(file_path):
-    try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            return data['test_accuracy']
-    except FileNotFoundError:
-        st.error(f"File not found: {file_path}")
-        return None
-    except KeyError:
-        st.error(f"Key 'test_accuracy' not found in {file_path}")
-        return None
-    except json.JSONDecodeError as e:
-        st.error(f"Error decoding JSON: {e}")
-        return None
+from metrics_store import metrics_store
 
 def plot_training_accuracy(history):
-    if history is None:
-        return
-    epochs = range(1, len(history['accuracy']) + 1)
+    epochs = list(range(1, len(history['accuracy']) + 1))
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=list(epochs), y=history['accuracy'], mode='lines+markers', name='Training Accuracy', line=dict(color='#eb1948')))
-    fig.add_trace(go.Scatter(x=list(epochs), y=history['val_accuracy'], mode='lines+markers', name='Validation Accuracy', line=dict(color='#b71338')))
+    fig.add_trace(go.Scatter(x=epochs, y=history['accuracy'], mode='lines+markers', name='Training Accuracy', line=dict(color='#eb1948')))
+    fig.add_trace(go.Scatter(x=epochs, y=history['val_accuracy'], mode='lines+markers', name='Validation Accuracy', line=dict(color='#b71338')))
     fig.update_layout(title='Training and Validation Accuracy', xaxis_title='Epochs', yaxis_title='Accuracy')
-    st.plotly_chart(fig)
+    return fig
 
 def plot_training_loss(history):
-    if history is None:
-        return
-    epochs = range(1, len(history['loss']) + 1)
+    epochs = list(range(1, len(history['loss']) + 1))
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=list(epochs), y=history['loss'], mode='lines+markers', name='Training Loss', line=dict(color='#eb1948')))
-    fig.add_trace(go.Scatter(x=list(epochs), y=history['val_loss'], mode='lines+markers', name='Validation Loss', line=dict(color='#b71338')))
+    fig.add_trace(go.Scatter(x=epochs, y=history['loss'], mode='lines+markers', name='Training Loss', line=dict(color='#eb1948')))
+    fig.add_trace(go.Scatter(x=epochs, y=history['val_loss'], mode='lines+markers', name='Validation Loss', line=dict(color='#b71338')))
     fig.update_layout(title='Training and Validation Loss', xaxis_title='Epochs', yaxis_title='Loss')
-    st.plotly_chart(fig)
+    return fig
 
 def plot_confusion_matrix(cm, classes):
-    if cm is None:
-        return
     cm_df = pd.DataFrame(cm, index=classes, columns=classes)
     fig = px.imshow(cm_df, text_auto=True, color_continuous_scale=['#eb1948', '#b71338'])
     fig.update_layout(title='Confusion Matrix', xaxis_title='Predicted', yaxis_title='True')
-    st.plotly_chart(fig)
+    return fig
+
+# Figures for one version of a model's metrics, built once and shared by every session
+@st.cache_resource(show_spinner=False, max_entries=16)
+def build_figures(name, version, _metrics):
+    figures = []
+    history = _metrics.get('history')
+    if history:
+        figures.append(plot_training_accuracy(history))
+        figures.append(plot_training_loss(history))
+    if _metrics.get('confusion_matrix'):
+        figures.append(plot_confusion_matrix(_metrics['confusion_matrix'], _metrics['class_names']))
+    return figures
+
+def show_performance(name, label):
+    try:
+        metrics, version = metrics_store.get(name)
+    except (OSError, ValueError) as e:
+        st.error(f"Could not load the {label} metrics: {e}")
+        return
+
+    test_accuracy = metrics.get('test_accuracy')
+    if test_accuracy is not None:
+        st.markdown(f'<p class="custom-font">{label} Test Accuracy: {test_accuracy:.4f} ({test_accuracy * 100:.2f}%)</p>', unsafe_allow_html=True)
+    for fig in build_figures(name, version, metrics):
+        st.plotly_chart(fig)
+
+    # Written by evaluate.py
+    if metrics.get('precision'):
+        st.dataframe(
+            pd.DataFrame({'Precision': metrics['precision'], 'Recall': metrics['recall']}, index=metrics['class_names']),
+            use_container_width=True,
+        )
+        st.caption(f"Evaluated on {metrics['test_images']} images ({metrics['evaluated_at'][:10]})")
+
+# Show the memory used by a model if it is already in the shared cache (never loads it).
+# The registry, and TensorFlow with it, is only imported once the Detection page has run.
+def show_model_footprint(name):
+    model_registry = sys.modules.get('model_registry')
+    if model_registry is None:
+        return
+    stats = model_registry.registry.stats()[name]
+    if stats['loaded']:
+        st.caption(f"Model in memory: {stats['memory_bytes'] / 1e6:.1f} MB, "
+                   f"loaded in {stats['load_seconds']:.2f}s, {stats['holders']} task(s) using it right now")
 
 def app():
     st.markdown('<h1 class="title-font">📊 Visualize and Analyze Model\'s Performance</h1>', unsafe_allow_html=True)
@@ -91,16 +101,8 @@ def app():
                         - **Interact with Visuals:** Check out the interactive plots and matrices below to get a comprehensive view of our model's performance. 📊
                         """)
             
-        model_leukemia = load_model('models/leukemia_cancer_model.h5')
-        history_leukemia = load_training_history('json_files/leukemia/training_history.json')
-        test_accuracy_leukemia = load_test_accuracy('json_files/leukemia/test_accuracy.json')
-        if test_accuracy_leukemia is not None:
-            st.markdown(f'<p class="custom-font">Leukemia Test Accuracy: {test_accuracy_leukemia:.4f} ({test_accuracy_leukemia * 100:.2f}%)</p>', unsafe_allow_html=True)
-        plot_training_accuracy(history_leukemia)
-        plot_training_loss(history_leukemia)
-        cm_leukemia = np.array([[392, 96], [23, 497]])
-        classes_leukemia = ['Non-Cancerous', 'Cancerous']
-        plot_confusion_matrix(cm_leukemia, classes_leukemia)
+        show_model_footprint('leukemia')
+        show_performance('leukemia', 'Leukemia')
         
 
     with tab2:
@@ -120,16 +122,8 @@ def app():
                         - **Interact with Visuals:** Check out the interactive plots and matrices below to get a comprehensive view of our model's performance. 📊
                         """)
             
-        model_lung = load_model('models/lung_cancer_model.h5')
-        history_lung = load_training_history('json_files/lung cancer/training_history.json')
-        test_accuracy_lung = load_test_accuracy('json_files/lung cancer/test_accuracy_and_training_history.json')
-        if test_accuracy_lung is not None:
-            st.markdown(f'<p class="custom-font">Lung Cancer Test Accuracy: {test_accuracy_lung:.4f} ({test_accuracy_lung * 100:.2f}%)</p>', unsafe_allow_html=True)
-        plot_training_accuracy(history_lung)
-        plot_training_loss(history_lung)
-        cm_lung = np.array([[515, 0, 0], [0, 492, 0], [0, 0, 493]])
-        classes_lung = ['lung_aca', 'lung_n', 'lung_scc']
-        plot_confusion_matrix(cm_lung, classes_lung)
+        show_model_footprint('lung')
+        show_performance('lung', 'Lung Cancer')
 
     with tab3:
         st.markdown('<h2 class="sub-title">Skin Cancer Model Performance</h2>', unsafe_allow_html=True)
@@ -149,17 +143,8 @@ def app():
                         - **Enhance Performance:** Use the insights to fine-tune and enhance your model’s accuracy. ⚙️
                         - **Interact with Visuals:** Check out the interactive plots and matrices below to get a comprehensive view of our model's performance. 📊
                         """)
-        model_skin = load_model('models/skin_cancer_model.h5')
-        test_accuracy_skin = load_test_accuracy('json_files/skin cancer/test_accuracy.json')
-        if test_accuracy_skin is not None:
-            test_accuracy_percentage = test_accuracy_skin * 100
-            st.markdown(f'<p class="custom-font">Skin Cancer Test Accuracy: {test_accuracy_skin:.4f} ({test_accuracy_skin * 100:.2f}%)</p>', unsafe_allow_html=True)
-        history_skin = load_training_history('json_files/skin cancer/training_history.json')
-        plot_training_accuracy(history_skin)
-        plot_training_loss(history_skin)
-        cm_skin = np.array([[447, 53], [135, 365]])
-        classes_skin = ['Benign', 'Malignant']
-        plot_confusion_matrix(cm_skin, classes_skin)
+        show_model_footprint('skin')
+        show_performance('skin', 'Skin Cancer')
 
 if __name__ == "__main__":
     app()